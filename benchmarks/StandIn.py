@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+import random
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+import requests
+
+# path prefixes the stand-in serves each REST API under, they mirror the real base URLs
+servicePrefixes = {'bamboo': '/bamboo/rest/api/latest/', 'jira': '/jira/rest/api/2/'}
+baseURLNames = {'bamboo': 'BAMBOO_BASE_URL', 'jira': 'JIRA_BASE_URL'}
+
+keyListPattern = re.compile(r'key in \(([^)]*)\)')
+
+
+def loadFixtures(fileName):
+    with open(fileName, 'r', encoding='utf-8') as fixturesFile:
+        return json.load(fixturesFile)
+
+
+def getFixtureKey(path, query):
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    if not params:
+        return path
+    return path + '?' + urlencode(params)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, body = self.server.standIn.respond(self.path, self.headers)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandIn(object):
+    """Local Bamboo and Jira REST server replaying recorded responses.
+
+    fixtures is {service: {path or path?sorted query: response JSON}}. With upstreams ({service: real base URL})
+    every request is forwarded to the real service and its response recorded into fixtures.
+    Replayed responses take latency plus up to latencyJitter seconds, errorRate of them fail with errorStatus,
+    all of these can be changed while the stand-in runs.
+    """
+
+    def __init__(self, fixtures=None, upstreams=None, port=0, latency=0.0, latencyJitter=0.0, errorRate=0.0, errorStatus=503):
+        self.fixtures = fixtures if fixtures is not None else {}
+        self.upstreams = upstreams
+        self.port = port
+        self.latency = latency
+        self.latencyJitter = latencyJitter
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.server = None
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), StandInHandler)
+        self.server.standIn = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    # environment the bot reads its upstream base URLs from, it has to be set before csreleasebot is imported
+    def getBaseURLs(self):
+        return {baseURLNames[service]: self.url + prefix for service, prefix in servicePrefixes.items()}
+
+    def getCallCount(self, service=None):
+        with self.lock:
+            if service is None:
+                return sum(self.calls.values())
+            return self.calls.get(service, 0)
+
+    def respond(self, requestPath, headers):
+        url = urlsplit(requestPath)
+        for service, prefix in servicePrefixes.items():
+            if url.path.startswith(prefix):
+                with self.lock:
+                    self.calls[service] = self.calls.get(service, 0) + 1
+                path = url.path[len(prefix):]
+                if self.upstreams is not None:
+                    responseJSON = self.record(service, path, url.query, headers)
+                else:
+                    injectedError = self.inject()
+                    if injectedError is not None:
+                        return injectedError
+                    responseJSON = self.replay(service, path, url.query)
+                if responseJSON is not None:
+                    return 200, json.dumps(responseJSON).encode('utf-8')
+        return 404, json.dumps({'message': 'Not recorded', 'status-code': 404}).encode('utf-8')
+
+    def inject(self):
+        delay = self.latency + random.uniform(0, self.latencyJitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.errorRate > 0 and random.random() < self.errorRate:
+            return self.errorStatus, json.dumps({'message': 'Injected error', 'status-code': self.errorStatus}).encode('utf-8')
+        return None
+
+    # exact request first, then the path with any query, Jira key searches are answered from recorded issues
+    def replay(self, service, path, query):
+        serviceFixtures = self.fixtures.get(service, {})
+        responseJSON = serviceFixtures.get(getFixtureKey(path, query))
+        if responseJSON is None:
+            responseJSON = serviceFixtures.get(path)
+        if responseJSON is None and service == 'jira' and path == 'search':
+            responseJSON = self.replaySearch(serviceFixtures, dict(parse_qsl(query)).get('jql', ''))
+        return responseJSON
+
+    # recorded issues never change, so sweeps for issues updated since the last check find none
+    def replaySearch(self, serviceFixtures, jql):
+        match = keyListPattern.search(jql)
+        if match is None or 'updated >=' in jql:
+            return {'startAt': 0, 'total': 0, 'issues': []}
+        issues = []
+        for key in match.group(1).split(','):
+            issueJSON = serviceFixtures.get('issue/' + key.strip())
+            if issueJSON is not None:
+                issues.append(issueJSON)
+        return {'startAt': 0, 'total': len(issues), 'issues': issues}
+
+    def record(self, service, path, query, headers):
+        upstreamURL = self.upstreams[service] + path
+        if query:
+            upstreamURL += '?' + query
+        response = requests.get(upstreamURL, headers={'Authorization': headers.get('Authorization', ''), 'Accept': 'application/json'})
+        if response.status_code != 200:
+            return None
+        responseJSON = response.json()
+        with self.lock:
+            serviceFixtures = self.fixtures.setdefault(service, {})
+            serviceFixtures[getFixtureKey(path, query)] = responseJSON
+            serviceFixtures.setdefault(path, responseJSON)
+        return responseJSON
+
+    def save(self, fileName):
+        with self.lock:
+            with open(fileName, 'w', encoding='utf-8') as fixturesFile:
+                json.dump(self.fixtures, fixturesFile, indent=2, sort_keys=True, ensure_ascii=False)
+
+
+# serves the fixtures for a bot started separately, e.g. a gunicorn worker under load:
+#   python -m benchmarks.StandIn --port 8900 --latency 0.05
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded Bamboo and Jira responses.')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(__file__), 'fixtures', 'upstream.json'))
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='up to this many more seconds, uniformly')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of responses failing with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    arguments = parser.parse_args()
+    standIn = StandIn(loadFixtures(arguments.fixtures), port=arguments.port, latency=arguments.latency,
+                      latencyJitter=arguments.latency_jitter, errorRate=arguments.error_rate, errorStatus=arguments.error_status)
+    standIn.start()
+    for name, url in sorted(standIn.getBaseURLs().items()):
+        print('export %s=%s' % (name, url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standIn.stop()
+
+
+if __name__ == '__main__':
+    main()
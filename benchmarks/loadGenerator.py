@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# Replays captured api.ai requests against the webhook in stages of offered load, to find where a worker saturates:
+#   python -m benchmarks.loadGenerator --stages 20:30,200:10,20:30 --concurrency 16 --latency 0.05 --error-rate 0.01
+# Without --url the app and the Bamboo/Jira stand-in run in this process. With --url the target runs separately,
+# pointed at a stand-in started with python -m benchmarks.StandIn.
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import StandIn
+from benchmarks import webhookBenchmark
+
+metricPattern = re.compile(r'^([a-z_]+(?:\{[^}]*\})?) ([0-9.eE+-]+)$')
+
+
+class Stage(object):
+
+    def __init__(self, rate, duration):
+        self.rate = rate
+        self.duration = duration
+        self.results = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def fromText(cls, text):
+        rate, duration = text.split(':')
+        return cls(float(rate), float(duration))
+
+    def add(self, result):
+        with self.lock:
+            self.results.append(result)
+
+
+class Target(object):
+    """Posts requests to a webhook URL with one pooled session per thread."""
+
+    def __init__(self, url):
+        self.url = url
+        self.sessions = threading.local()
+
+    def getSession(self):
+        session = getattr(self.sessions, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self.sessions.session = session
+        return session
+
+    # answers without speech mean the action failed and ErrorMiddleware replied with an empty response
+    def post(self, req):
+        try:
+            response = self.getSession().post(self.url, data=json.dumps(req), headers={'Content-Type': 'application/json'}, timeout=30)
+            return response.status_code == 200 and bool(response.json().get('speech'))
+        except (requests.RequestException, ValueError):
+            return False
+
+    def getMetrics(self):
+        metrics = {}
+        try:
+            text = self.getSession().get(self.url.rsplit('/', 1)[0] + '/metrics', timeout=10).text
+        except requests.RequestException:
+            return metrics
+        for line in text.splitlines():
+            match = metricPattern.match(line)
+            if match is not None:
+                metrics[match.group(1)] = float(match.group(2))
+        return metrics
+
+
+def sumMetrics(metrics, prefix, label=''):
+    return sum(value for name, value in metrics.items() if name.startswith(prefix) and label in name)
+
+
+# latency counts from the time a request was due, so a backed up worker shows up in the percentiles
+def send(target, stage, req, dueTime):
+    ok = target.post(req)
+    stage.add((time.perf_counter() - dueTime, ok))
+
+
+def runStage(target, stage, reqs, concurrency, offset):
+    startTime = time.perf_counter()
+    endTime = startTime + stage.duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if stage.rate <= 0:
+            # closed loop: every worker sends its next request as soon as the previous one is answered
+            def loop(worker):
+                i = worker
+                while time.perf_counter() < endTime:
+                    send(target, stage, reqs[(offset + i) % len(reqs)], time.perf_counter())
+                    i += concurrency
+            list(executor.map(loop, range(concurrency)))
+        else:
+            i = 0
+            while True:
+                dueTime = startTime + i / stage.rate
+                if dueTime >= endTime:
+                    break
+                delay = dueTime - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, target, stage, reqs[(offset + i) % len(reqs)], dueTime)
+                i += 1
+    return time.perf_counter() - startTime
+
+
+def summarizeStage(stage, elapsed, metricsBefore, metricsAfter):
+    durations = sorted(duration for duration, ok in stage.results)
+    requestCount = len(durations)
+    hits = sumMetrics(metricsAfter, 'csreleasebot_cache_requests_total', 'result="hits"') - \
+        sumMetrics(metricsBefore, 'csreleasebot_cache_requests_total', 'result="hits"')
+    upstreamCalls = sumMetrics(metricsAfter, 'csreleasebot_upstream_calls_total') - sumMetrics(metricsBefore, 'csreleasebot_upstream_calls_total')
+    return {
+        'offeredRate': stage.rate,
+        'throughput': requestCount / elapsed if elapsed else 0.0,
+        'requests': requestCount,
+        'errors': sum(1 for duration, ok in stage.results if not ok),
+        'p50': webhookBenchmark.percentile(durations, 50) * 1000,
+        'p95': webhookBenchmark.percentile(durations, 95) * 1000,
+        'p99': webhookBenchmark.percentile(durations, 99) * 1000,
+        'upstreamCallsPerRequest': upstreamCalls / requestCount if requestCount else 0.0,
+        'cacheHits': hits,
+    }
+
+
+def printSummary(summaries):
+    print('%9s %10s %8s %7s %9s %9s %9s %9s %10s' % ('offered', 'achieved', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                    'upstream', 'cache hits'))
+    for summary in summaries:
+        offered = 'max' if summary['offeredRate'] <= 0 else '%.1f' % summary['offeredRate']
+        saturated = summary['offeredRate'] > 0 and summary['throughput'] < 0.9 * summary['offeredRate']
+        print('%9s %10.1f %8d %7d %9.2f %9.2f %9.2f %9.2f %10d%s' % (offered, summary['throughput'], summary['requests'], summary['errors'],
+                                                                   summary['p50'], summary['p95'], summary['p99'],
+                                                                   summary['upstreamCallsPerRequest'], summary['cacheHits'],
+                                                                   '  saturated' if saturated else ''))
+
+
+# runs the Flask app on a threaded server in this process, talking to an in-process stand-in
+def startLocalTarget(arguments):
+    from werkzeug.serving import make_server
+
+    standIn = StandIn.StandIn(StandIn.loadFixtures(arguments.fixtures), latency=arguments.latency, latencyJitter=arguments.latency_jitter,
+                              errorRate=arguments.error_rate)
+    standIn.start()
+    app = webhookBenchmark.importApp(standIn).createApp()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        standIn.stop()
+    return 'http://127.0.0.1:%d/webhook' % server.server_port, stop
+
+
+def parseArguments():
+    parser = argparse.ArgumentParser(description='Load and soak test the webhook with captured api.ai requests.')
+    parser.add_argument('--requests', default=os.path.join(webhookBenchmark.fixturesDirectory, 'requests.jsonl'),
+                        help='api.ai requests, one JSON per line')
+    parser.add_argument('--fixtures', default=os.path.join(webhookBenchmark.fixturesDirectory, 'upstream.json'),
+                        help='recorded Bamboo and Jira responses for the in-process stand-in')
+    parser.add_argument('--url', help='webhook of a separately started bot, e.g. http://127.0.0.1:5000/webhook')
+    parser.add_argument('--stages', default='10:10,50:10,100:10,0:10',
+                        help='comma separated requests per second:seconds, a rate of 0 sends as fast as --concurrency allows')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the in-process stand-in adds to every upstream call')
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of upstream calls the in-process stand-in fails')
+    parser.add_argument('--output', help='write the stage summaries as JSON')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parseArguments()
+    stop = None
+    url = arguments.url
+    if url is None:
+        url, stop = startLocalTarget(arguments)
+    target = Target(url)
+    reqs = webhookBenchmark.loadRequests(arguments.requests)
+    summaries = []
+    offset = 0
+    try:
+        for stage in [Stage.fromText(text) for text in arguments.stages.split(',')]:
+            metricsBefore = target.getMetrics()
+            elapsed = runStage(target, stage, reqs, arguments.concurrency, offset)
+            offset += len(stage.results)
+            summaries.append(summarizeStage(stage, elapsed, metricsBefore, target.getMetrics()))
+    finally:
+        if stop is not None:
+            stop()
+
+    printSummary(summaries)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as outputFile:
+            json.dump(summaries, outputFile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
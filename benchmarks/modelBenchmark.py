@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# Attribute access and memory costs of the Build and Issue models, no Bamboo or Jira access needed:
+#   python -m benchmarks.modelBenchmark
+import os
+import timeit
+import tracemalloc
+
+os.environ.setdefault('BAMBOO_USER', 'benchmark')
+os.environ.setdefault('BAMBOO_PASS', 'benchmark')
+
+from csreleasebot import BambooAdapter
+from csreleasebot.JiraAdapter import Issue
+
+INSTANCES = 10000
+READS = 1000000
+
+buildJSON = {'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished', 'buildRelativeTime': '2 hours ago',
+             'progress': {'prettyTimeRemaining': '5 minutes', 'percentageCompletedPretty': '50%'}}
+issueJSON = {'key': 'CDBT-4289', 'id': '4289', 'fields': {
+    'status': {'name': 'Closed', 'statusCategory': {'id': 3}},
+    'updated': '2016-12-26T15:21:55.097+0200',
+    'resolution': {'id': '1', 'name': 'Done'},
+    'resolutiondate': '2016-12-26T15:21:55.097+0200',
+    'issuelinks': [{'outwardIssue': {'key': 'CDBR-898', 'fields': {'status': {'name': 'Closed', 'statusCategory': {'id': 3}}}}}],
+}}
+releaseJSON = {'key': 'CDBR-898', 'id': '898', 'fields': dict(issueJSON['fields'], issuelinks=[])}
+
+
+def measureReads(instance, attributeName):
+    seconds = timeit.timeit('instance.%s' % attributeName, globals={'instance': instance}, number=READS)
+    return seconds / READS * 1e9
+
+
+def measureMemory(factory):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    instances = [factory() for _ in range(INSTANCES)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del instances
+    return size / INSTANCES
+
+
+def main():
+    build = BambooAdapter.buildFromResultJSON(buildJSON)
+    issue = Issue.fromLoadedIssueJSON(issueJSON)
+    releaseIssue = Issue.fromLoadedIssueJSON(releaseJSON)
+    rows = [
+        ('Build.buildState read', '%.1f ns' % measureReads(build, 'buildState')),
+        ('Build memory', '%.0f bytes' % measureMemory(lambda: BambooAdapter.buildFromResultJSON(buildJSON))),
+        ('Issue.statusName read', '%.1f ns' % measureReads(issue, 'statusName')),
+        ('Issue.resolutionId read', '%.1f ns' % measureReads(issue, 'resolutionId')),
+        ('Issue.isDeployed read', '%.1f ns' % measureReads(releaseIssue, 'isDeployed')),
+        ('Issue memory', '%.0f bytes' % measureMemory(lambda: Issue.fromLoadedIssueJSON(issueJSON))),
+    ]
+    for name, value in rows:
+        print('%-26s %12s' % (name, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# Drives /webhook with recorded api.ai requests against the Bamboo and Jira stand-in, without network access:
+#   python -m benchmarks.webhookBenchmark --iterations 500 --concurrency 4 --output results.json
+# Record fresh fixtures from the real services with --record (needs BAMBOO_USER and BAMBOO_PASS).
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import StandIn
+
+fixturesDirectory = os.path.join(os.path.dirname(__file__), 'fixtures')
+upstreamURLs = {'bamboo': 'http://build.orioncb.com/rest/api/latest/', 'jira': 'http://issues.orioncb.com/rest/api/2/'}
+
+
+def loadRequests(fileName):
+    with open(fileName, 'r', encoding='utf-8') as requestsFile:
+        return [json.loads(line) for line in requestsFile if line.strip()]
+
+
+def percentile(sortedValues, rank):
+    if not sortedValues:
+        return 0.0
+    index = max(0, min(len(sortedValues) - 1, int(round(rank / 100.0 * len(sortedValues) + 0.5)) - 1))
+    return sortedValues[index]
+
+
+# csreleasebot reads its base URLs and credentials at import time, so it is imported once the stand-in runs
+def importApp(standIn):
+    os.environ.update(standIn.getBaseURLs())
+    os.environ.setdefault('BAMBOO_USER', 'benchmark')
+    os.environ.setdefault('BAMBOO_PASS', 'benchmark')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    return importlib.import_module('csreleasebot.app')
+
+
+def clearCaches():
+    Cache = importlib.import_module('csreleasebot.Cache')
+    for cache in list(Cache.caches):
+        cache.clear()
+
+
+class Runner(object):
+    """Posts requests to the Flask app from a pool of threads, each with its own test client."""
+
+    def __init__(self, app, concurrency):
+        self.app = app
+        self.concurrency = concurrency
+        self.clients = threading.local()
+
+    def getClient(self):
+        client = getattr(self.clients, 'client', None)
+        if client is None:
+            client = self.app.test_client()
+            self.clients.client = client
+        return client
+
+    # a failing action is answered with 200 and an empty response by ErrorMiddleware, so answers without speech are errors
+    def post(self, req):
+        body = json.dumps(req)
+        startTime = time.perf_counter()
+        response = self.getClient().post('/webhook', data=body, content_type='application/json')
+        duration = time.perf_counter() - startTime
+        ok = response.status_code == 200 and bool(json.loads(response.get_data(as_text=True)).get('speech'))
+        return req.get('result').get('action'), duration, ok
+
+    def run(self, reqs, coldCaches=False):
+        if coldCaches:
+            results = []
+            for req in reqs:
+                clearCaches()
+                results.append(self.post(req))
+            return results
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(self.post, reqs))
+
+
+def getUpstreamCallsPerRequest(action):
+    Metrics = importlib.import_module('csreleasebot.Metrics')
+    counts, total, count = Metrics.upstreamCallsPerRequest.values.get((('action', action),), (None, 0.0, 0))
+    if count == 0:
+        return 0.0
+    return total / count
+
+
+def summarize(results, elapsed, upstreamCalls):
+    byAction = {}
+    for action, duration, ok in results:
+        byAction.setdefault(action, []).append((duration, ok))
+    summary = {'requests': len(results), 'seconds': elapsed, 'throughput': len(results) / elapsed if elapsed else 0.0,
+               'upstreamCallsPerRequest': upstreamCalls / float(len(results)) if results else 0.0, 'actions': {}}
+    for action, actionResults in sorted(byAction.items()):
+        durations = sorted(duration for duration, ok in actionResults)
+        summary['actions'][action] = {
+            'requests': len(durations),
+            'errors': sum(1 for duration, ok in actionResults if not ok),
+            'p50': percentile(durations, 50) * 1000,
+            'p95': percentile(durations, 95) * 1000,
+            'p99': percentile(durations, 99) * 1000,
+            'upstreamCallsPerRequest': getUpstreamCallsPerRequest(action),
+        }
+    return summary
+
+
+def printSummary(summary):
+    print('%-24s %8s %7s %9s %9s %9s %9s' % ('action', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'upstream'))
+    for action, stats in summary['actions'].items():
+        print('%-24s %8d %7d %9.2f %9.2f %9.2f %9.2f' % (action, stats['requests'], stats['errors'], stats['p50'], stats['p95'],
+                                                         stats['p99'], stats['upstreamCallsPerRequest']))
+    print('%d requests in %.2f s, %.1f requests/s, %.2f upstream calls/request'
+          % (summary['requests'], summary['seconds'], summary['throughput'], summary['upstreamCallsPerRequest']))
+
+
+def parseArguments():
+    parser = argparse.ArgumentParser(description='Benchmark the webhook against the Bamboo and Jira stand-in.')
+    parser.add_argument('--requests', default=os.path.join(fixturesDirectory, 'requests.jsonl'), help='api.ai requests, one JSON per line')
+    parser.add_argument('--fixtures', default=os.path.join(fixturesDirectory, 'upstream.json'), help='recorded Bamboo and Jira responses')
+    parser.add_argument('--iterations', type=int, default=200, help='requests to send, cycling through the request file')
+    parser.add_argument('--warmup', type=int, default=20, help='requests sent before measuring')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--cold', action='store_true', help='clear every cache before each request, runs serially')
+    parser.add_argument('--record', action='store_true', help='forward to the real services and save their responses to --fixtures')
+    parser.add_argument('--output', help='write the summary as JSON, to compare releases')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parseArguments()
+    if arguments.record:
+        standIn = StandIn.StandIn(upstreams=upstreamURLs)
+    else:
+        standIn = StandIn.StandIn(StandIn.loadFixtures(arguments.fixtures))
+    standIn.start()
+    try:
+        app = importApp(standIn)
+        runner = Runner(app.createApp(), arguments.concurrency)
+        reqs = loadRequests(arguments.requests)
+        runner.run([reqs[i % len(reqs)] for i in range(arguments.warmup)])
+
+        Metrics = importlib.import_module('csreleasebot.Metrics')
+        Metrics.upstreamCallsPerRequest.values.clear()
+        callsBefore = standIn.getCallCount()
+        startTime = time.perf_counter()
+        results = runner.run([reqs[i % len(reqs)] for i in range(arguments.iterations)], arguments.cold)
+        summary = summarize(results, time.perf_counter() - startTime, standIn.getCallCount() - callsBefore)
+    finally:
+        standIn.stop()
+
+    printSummary(summary)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as outputFile:
+            json.dump(summary, outputFile, indent=2, sort_keys=True)
+    if arguments.record:
+        standIn.save(arguments.fixtures)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,57 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import concurrent.futures
 import datetime as dt
+import functools
 import os
 import json
 
 import logging
-import pytz
-import requests
 from enum import Enum
 
-from csreleasebot import Common
+try:
+    import contextvars
+except ImportError:  # python 3.6
+    contextvars = None
 
-bambooBaseURL = "http://build.orioncb.com/rest/api/latest/"
-buildNamesMap = {"beta": "DEPL-BET0", "prod": "DEPL-BET1", "alfa": "DEPL-GEN1", "dev": "DEPL-GEN0", "ibank": "DEPL-IBD2"}
-buildSchedulesMap = {
-    "beta": [dt.time(7, 0, 0), dt.time(12, 0, 0), dt.time(16, 0, 0), dt.time(19, 0, 0)],
-    "prod": [dt.time(12, 0, 0), dt.time(22, 0, 0)],
-    "dev": [dt.time(10, 0, 0), dt.time(11, 0, 0), dt.time(12, 0, 0), dt.time(14, 0, 0),
-            dt.time(15, 0, 0), dt.time(16, 0, 0), dt.time(17, 0, 0), dt.time(18, 0, 0),
-            dt.time(19, 0, 0), dt.time(20, 0, 0), dt.time(21, 0, 0)],
-    "alfa": [dt.time(10, 30, 0), dt.time(12, 30, 0), dt.time(15, 30, 0), dt.time(17, 30, 0),
-             dt.time(19, 30, 0), dt.time(20, 30, 0), dt.time(21, 30, 0), dt.time(22, 30, 0)],
-    "ibank": [dt.time(0, 0, 0)],
-}
-
-buildSchedulesNamedMap = {
-    'Öğlen': dt.time(12, 0, 0), 'Akşam': dt.time(22, 0, 0)
-}
+from csreleasebot import Cache
+from csreleasebot import Common
+from csreleasebot import HttpClient
+from csreleasebot import Metrics
+from csreleasebot import Plans
+from csreleasebot import Schedule
+from csreleasebot.Router import router
 
+bambooBaseURL = os.environ.get("BAMBOO_BASE_URL", "http://build.orioncb.com/rest/api/latest/")
 BAMBOO_USER = os.environ['BAMBOO_USER']
 BAMBOO_PASS = os.environ['BAMBOO_PASS']
 
+# 'serial' asks for the latest build and then the next one, 'list' gets both from the result list in one request
+buildStateMode = os.environ.get('BAMBOO_BUILD_STATE_MODE', 'serial')
+
+# finished builds never change, only 'latest', running and not yet started builds expire
+buildCacheTTL = float(os.environ.get('BUILD_CACHE_TTL', 15))
+buildCache = Cache.TTLCache('build', staleTTL=float(os.environ.get('BUILD_CACHE_STALE_TTL', 60)))
+# finished builds pushed by the Bamboo webhook stay the latest until the next push, they are only polled again after this,
+# Bamboo pushes only on completion, so whether the next build has started is still polled every buildCacheTTL
+buildPushTTL = float(os.environ.get('BUILD_PUSH_TTL', 600))
+
+# all plans are asked for at once, plans without a state after this many seconds are answered as unknown
+releaseStatesBudget = float(os.environ.get('RELEASE_STATES_BUDGET', 3))
+__releaseStatesExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=int(os.environ.get('RELEASE_STATES_WORKERS', 8)))
+
+
+def getReleaseStatesExecutor():
+    return __releaseStatesExecutor
+
 
 class Build(object):
-    buildState = None
-    buildNumber = None
-    buildStartedTime = None
-    buildCompletedTime = None
-    buildRelativeTime = None
-    lifeCycleState = None
-    percentageCompletedPretty = None
-    prettyTimeRemaining = None
-    startedTime = None
-    prettyStartedTime = None
+    __slots__ = ('buildState', 'buildNumber', 'buildStartedTime', 'buildCompletedTime', 'buildRelativeTime', 'lifeCycleState',
+                 'percentageCompletedPretty', 'prettyTimeRemaining', 'startedTime', 'prettyStartedTime')
+
+    def __init__(self):
+        for name in Build.__slots__:
+            setattr(self, name, None)
 
 
 class BuildState(Enum):
@@ -50,18 +60,63 @@ class BuildState(Enum):
     FAILED = 'Failed'
 
 
-def getBuildResult(buildName, buildNumber):
-    bambooBuildName = buildNamesMap.get(buildName)
+# plans.yaml is checked for changes on every call, so edits to it apply without a restart
+def getPlanKey(buildName):
+    return Plans.getPlans().buildNames.get(buildName)
+
+
+def getBuildResultQuery(buildName, buildNumber):
+    bambooBuildName = getPlanKey(buildName)
     buildURL = bambooBaseURL + "result/" + str(bambooBuildName) + "/"
     if buildNumber is None:
         buildNumber = "latest"
-    buildQueryResult = requests.get(buildURL + str(buildNumber), headers={'content-type': 'application/json','Accept': 'application/json'}, auth=(BAMBOO_USER, BAMBOO_PASS))
+    return buildURL + str(buildNumber)
+
+
+@Metrics.timed('BambooAdapter.getBuildResult')
+def getBuildResult(buildName, buildNumber):
+    buildQueryResult = HttpClient.get('bamboo', getBuildResultQuery(buildName, buildNumber), auth=(BAMBOO_USER, BAMBOO_PASS))
     buildQueryResultJSON = json.loads(buildQueryResult.text)
     return buildQueryResultJSON
 
 
-def findSingleBuildState(buildName, buildNumber):
-    buildQueryResultJSON = getBuildResult(buildName, buildNumber)
+@Metrics.timed('BambooAdapter.getBuildResult')
+async def getBuildResultAsync(buildName, buildNumber):
+    buildQueryResult = await HttpClient.getAsync('bamboo', getBuildResultQuery(buildName, buildNumber), auth=(BAMBOO_USER, BAMBOO_PASS))
+    buildQueryResultJSON = json.loads(buildQueryResult.text)
+    return buildQueryResultJSON
+
+
+def getBuildResultsQuery(buildName, maxResults):
+    bambooBuildName = getPlanKey(buildName)
+    buildURL = bambooBaseURL + "result/" + str(bambooBuildName)
+    params = {'includeAllStates': 'true', 'max-results': maxResults, 'expand': 'results.result'}
+    return buildURL, params
+
+
+def getResultsFromResultsJSON(buildQueryResultJSON):
+    results = buildQueryResultJSON.get('results')
+    if results is None:
+        return []
+    return results.get('result', [])
+
+
+# newest results first, in progress ones included
+@Metrics.timed('BambooAdapter.getBuildResults')
+def getBuildResults(buildName, maxResults):
+    buildURL, params = getBuildResultsQuery(buildName, maxResults)
+    buildQueryResult = HttpClient.get('bamboo', buildURL, params=params, auth=(BAMBOO_USER, BAMBOO_PASS))
+    return getResultsFromResultsJSON(json.loads(buildQueryResult.text))
+
+
+@Metrics.timed('BambooAdapter.getBuildResults')
+async def getBuildResultsAsync(buildName, maxResults):
+    buildURL, params = getBuildResultsQuery(buildName, maxResults)
+    buildQueryResult = await HttpClient.getAsync('bamboo', buildURL, params=params, auth=(BAMBOO_USER, BAMBOO_PASS))
+    return getResultsFromResultsJSON(json.loads(buildQueryResult.text))
+
+
+def buildFromResultJSON(buildQueryResultJSON):
     logging.debug(buildQueryResultJSON)
     build = Build()
     build.buildState = buildQueryResultJSON.get("state")
@@ -79,12 +134,171 @@ def findSingleBuildState(buildName, buildNumber):
     return build
 
 
+def isBuildFinished(build):
+    return build.buildState in ('Successful', 'Failed')
+
+
+def getBuildCacheKey(buildName, buildNumber):
+    return getPlanCacheKey(getPlanKey(buildName), buildNumber)
+
+
+def getPlanCacheKey(planKey, buildNumber):
+    if buildNumber is None:
+        buildNumber = 'latest'
+    return planKey, str(buildNumber)
+
+
+def getBuildTTL(buildNumber):
+    def ttlOf(build):
+        if buildNumber not in (None, 'latest') and isBuildFinished(build):
+            return None
+        return buildCacheTTL
+    return ttlOf
+
+
+def findSingleBuildState(buildName, buildNumber):
+    def load():
+        return buildFromResultJSON(getBuildResult(buildName, buildNumber))
+
+    return buildCache.get(getBuildCacheKey(buildName, buildNumber), load, getBuildTTL(buildNumber))
+
+
+async def findSingleBuildStateAsync(buildName, buildNumber):
+    async def load():
+        return buildFromResultJSON(await getBuildResultAsync(buildName, buildNumber))
+
+    return await buildCache.getAsync(getBuildCacheKey(buildName, buildNumber), load, getBuildTTL(buildNumber))
+
+
 def findBuildState(buildName):
+    if buildStateMode == 'list':
+        return findBuildStateFromResultList(buildName)
     buildLatest = findSingleBuildState(buildName, None)
+    buildCurrent = None
+    if buildLatest.buildState == "Successful":
+        buildCurrent = findSingleBuildState(buildName, buildLatest.buildNumber + 1)
+    return resolveBuildState(buildLatest, buildCurrent)
+
+
+async def findBuildStateAsync(buildName):
+    if buildStateMode == 'list':
+        return await findBuildStateFromResultListAsync(buildName)
+    buildLatest = await findSingleBuildStateAsync(buildName, None)
+    buildCurrent = None
+    if buildLatest.buildState == "Successful":
+        buildCurrent = await findSingleBuildStateAsync(buildName, buildLatest.buildNumber + 1)
+    return resolveBuildState(buildLatest, buildCurrent)
+
+
+def getFinishedBuildState(buildName, future):
+    if not future.done() or future.cancelled():
+        logging.warning('State of %s was not found within %s seconds', buildName, releaseStatesBudget)
+        return None, None
+    if future.exception() is not None:
+        logging.warning('State of %s could not be found: %r', buildName, future.exception())
+        return None, None
+    return future.result()
+
+
+# returns {buildName: (result, build)} within budget seconds, plans still loading after it are left to fill the cache
+def findBuildStates(buildNames, budget=None):
+    futures = {}
+    for buildName in buildNames:
+        findState = findBuildState
+        if contextvars is not None:
+            findState = functools.partial(contextvars.copy_context().run, findBuildState)
+        futures[buildName] = getReleaseStatesExecutor().submit(findState, buildName)
+    concurrent.futures.wait(futures.values(), timeout=releaseStatesBudget if budget is None else budget)
+    return {buildName: getFinishedBuildState(buildName, future) for buildName, future in futures.items()}
+
+
+async def findBuildStatesAsync(buildNames, budget=None):
+    futures = {buildName: asyncio.ensure_future(findBuildStateAsync(buildName)) for buildName in buildNames}
+    if futures:
+        await asyncio.wait(list(futures.values()), timeout=releaseStatesBudget if budget is None else budget)
+    states = {buildName: getFinishedBuildState(buildName, future) for buildName, future in futures.items()}
+    for future in futures.values():
+        future.cancel()
+    return states
+
+
+def buildsFromResultsJSON(buildName, results):
+    builds = [buildFromResultJSON(buildQueryResultJSON) for buildQueryResultJSON in results]
+    for build in builds:
+        if isBuildFinished(build):
+            buildCache.put(getBuildCacheKey(buildName, build.buildNumber), build, None)
+    return builds
+
+
+# resolves the latest finished build and the one after it with a single request
+def findBuildStateFromResultList(buildName):
+    def load():
+        return buildsFromResultsJSON(buildName, getBuildResults(buildName, 2))
+
+    builds = buildCache.get(getBuildCacheKey(buildName, 'results'), load, lambda builds: buildCacheTTL)
+    return resolveBuildStateFromList(builds)
+
+
+async def findBuildStateFromResultListAsync(buildName):
+    async def load():
+        return buildsFromResultsJSON(buildName, await getBuildResultsAsync(buildName, 2))
+
+    builds = await buildCache.getAsync(getBuildCacheKey(buildName, 'results'), load, lambda builds: buildCacheTTL)
+    return resolveBuildStateFromList(builds)
+
+
+# the Bamboo webhook posts {'build': <result JSON as the result endpoint returns it, with its buildResultKey>}
+def getPushedBuild(pushJSON):
+    buildJSON = (pushJSON or {}).get('build')
+    if not isinstance(buildJSON, dict) or buildJSON.get('buildNumber') is None:
+        return None, None
+    planKey = (buildJSON.get('plan') or {}).get('key')
+    if planKey is None and buildJSON.get('buildResultKey') is not None:
+        planKey = buildJSON.get('buildResultKey').rsplit('-', 1)[0]
+    if planKey is None:
+        return None, None
+    return planKey, buildFromResultJSON(buildJSON)
+
+
+# updates the cached builds so both build state modes answer without asking Bamboo, returns False for unknown payloads
+def applyBuildPush(pushJSON):
+    planKey, build = getPushedBuild(pushJSON)
+    if build is None:
+        return False
+    if isBuildFinished(build):
+        buildCache.put(getPlanCacheKey(planKey, build.buildNumber), build, None)
+        buildCache.put(getPlanCacheKey(planKey, None), build, buildPushTTL)
+        buildCache.put(getPlanCacheKey(planKey, build.buildNumber + 1), Build(), buildCacheTTL)
+        buildCache.put(getPlanCacheKey(planKey, 'results'), [build], buildCacheTTL)
+    else:
+        buildCache.put(getPlanCacheKey(planKey, build.buildNumber), build, buildCacheTTL)
+        buildLatest = buildCache.peek(getPlanCacheKey(planKey, build.buildNumber - 1))
+        if buildLatest is not None and isBuildFinished(buildLatest):
+            buildCache.put(getPlanCacheKey(planKey, 'results'), [build, buildLatest], buildCacheTTL)
+        else:
+            buildCache.invalidate(getPlanCacheKey(planKey, 'results'))
+    logging.info('Build %s-%s pushed as %s', planKey, build.buildNumber, build.buildState)
+    return True
+
+
+def resolveBuildStateFromList(builds):
+    buildLatest = None
+    buildCurrent = Build()
+    for build in builds:
+        if build.lifeCycleState not in ('Queued', 'Pending', 'InProgress'):
+            buildLatest = build
+            break
+        elif buildCurrent.buildNumber is None:
+            buildCurrent = build
+    if buildLatest is None:
+        buildLatest = Build()
+    return resolveBuildState(buildLatest, buildCurrent)
+
+
+def resolveBuildState(buildLatest, buildCurrent):
     result = None
     build = None
     if buildLatest.buildState == "Successful":
-        buildCurrent = findSingleBuildState(buildName, buildLatest.buildNumber + 1)
         if buildCurrent.buildState is None:
             result = BuildState.COMPLETE
             build = buildLatest
@@ -100,58 +314,87 @@ def findBuildState(buildName):
     return result, build
 
 
-def findNextBuildTime(buildName):
-    for buildTime in buildSchedulesMap.get(buildName):
-        timeDeltaToNextBuild = getTimeDiffFromDelta(buildTime)
-        if timeDeltaToNextBuild > dt.timedelta():
-            return timeDeltaToNextBuild, buildTime
+# returns the time until the next scheduled build and its time of day, tomorrow's first build after the last one
+def findNextBuildTime(buildName, currTime=None):
+    return Plans.getPlans().scheduleIndex.nextRun(buildName, currTime)
 
 
-def findNextNamedBuildTime(buildName, scheduleName):
-    buildTime = buildSchedulesNamedMap.get(scheduleName)
-    timeDeltaToNextBuild = getTimeDiffFromDelta(buildTime)
-    return timeDeltaToNextBuild, buildTime
+# next build times of many plans at the same instant
+def findNextBuildTimes(buildNames, currTime=None):
+    return Plans.getPlans().scheduleIndex.nextRuns(buildNames, currTime)
 
 
-def getTimeDiffFromDelta(buildTime):
-    currTime = dt.datetime.now(pytz.timezone('Europe/Istanbul'))
-    nextBuildTime = dt.timedelta(hours=buildTime.hour, minutes=buildTime.minute, seconds=buildTime.second) - \
-                    dt.timedelta(hours=currTime.hour, minutes=currTime.minute, seconds=currTime.minute)
+def findNextNamedBuildTime(buildName, scheduleName, currTime=None):
+    plans = Plans.getPlans()
+    buildTime = plans.namedTimes.get(scheduleName)
+    schedule = plans.scheduleIndex.get(buildName)
+    if buildTime is None or schedule is None:
+        return None, buildTime
+    return schedule.nextRunAt(buildTime, currTime or Schedule.now()) or (None, buildTime)
+
 
-    return nextBuildTime
+def getTimeDiffFromDelta(buildTime):
+    return dt.timedelta(seconds=Schedule.toSecondsOfDay(buildTime) - Schedule.toSecondsOfDay(Schedule.now()))
 
 
 def timeToNextBuild(parameters):
     releaseName = parameters.get('releaseName')
-    timeToNextBuildVar, buildTime = findNextBuildTime(releaseName)
-    return str(timeToNextBuildVar) #TODO: beautify time text
+    nextBuildTime = findNextBuildTime(releaseName)
+    if nextBuildTime is None:
+        return None
+    timeToNextBuildVar, buildTime = nextBuildTime
+    return Common.printTimeDelta(timeToNextBuildVar)
 
 
-def checkReleaseState(req):
+def getReleaseStateParameters(req):
     result = req.get("result")
     parameters = result.get('parameters')
     if parameters is None:
-        return {}
+        return None
 
     releaseName = Common.getParameter(req, 'release-name-context', 'release-name')
     if releaseName is None:
-        return {}
+        return None
 
     releaseState = Common.getParameter(req, 'release-name-context', 'release-state')
     if releaseState is None:
-        return {}
+        return None
+    return releaseName
 
-    result, build = findBuildState(releaseName)
+
+def makeReleaseStateResponse(releaseName, result, build):
     speech = "%s release is %s" % (releaseName, result.value)
     return Common.makeCommonResponse(speech)
 
 
-def checkReleaseTime(req):
+@router.action('check-release-state')
+def checkReleaseState(req):
+    releaseName = getReleaseStateParameters(req)
+    if releaseName is None:
+        return {}
+    result, build = findBuildState(releaseName)
+    return makeReleaseStateResponse(releaseName, result, build)
+
+
+@router.asyncAction('check-release-state')
+async def checkReleaseStateAsync(req):
+    releaseName = getReleaseStateParameters(req)
+    if releaseName is None:
+        return {}
+    result, build = await findBuildStateAsync(releaseName)
+    return makeReleaseStateResponse(releaseName, result, build)
+
+
+# parameters checkReleaseTime matches the response model with
+releaseTimeParameterNames = ['askedBuildState', 'tense', 'currentBuildState']
+
+
+def getReleaseTimeParameters(req):
     result = req.get("result")
     parameters = result.get('parameters')
 
     if parameters is None:
-        return {}
+        return None
 
     releaseName = Common.getParameter(req, 'release-name-context', 'release-name')
 
@@ -159,8 +402,10 @@ def checkReleaseTime(req):
 
     askedReleaseState = Common.getParameter(req, 'release-name-context', 'release-state')
 
-    currentBuildState, build = findBuildState(releaseName)
+    return releaseName, tense, askedReleaseState
+
 
+def makeReleaseTimeResponse(releaseName, tense, askedReleaseState, currentBuildState, build):
     matchParameters = {'askedBuildState': askedReleaseState, 'tense': tense, 'currentBuildState': currentBuildState.value}
 
     message = Common.getMessageFromFile('outputs.yaml', 'checkReleaseTime', matchParameters)
@@ -170,3 +415,46 @@ def checkReleaseTime(req):
     speech = message
 
     return Common.makeCommonResponse(speech)
+
+
+@router.action('check-release-time')
+def checkReleaseTime(req):
+    releaseTimeParameters = getReleaseTimeParameters(req)
+    if releaseTimeParameters is None:
+        return {}
+    releaseName, tense, askedReleaseState = releaseTimeParameters
+    currentBuildState, build = findBuildState(releaseName)
+    return makeReleaseTimeResponse(releaseName, tense, askedReleaseState, currentBuildState, build)
+
+
+@router.asyncAction('check-release-time')
+async def checkReleaseTimeAsync(req):
+    releaseTimeParameters = getReleaseTimeParameters(req)
+    if releaseTimeParameters is None:
+        return {}
+    releaseName, tense, askedReleaseState = releaseTimeParameters
+    currentBuildState, build = await findBuildStateAsync(releaseName)
+    return makeReleaseTimeResponse(releaseName, tense, askedReleaseState, currentBuildState, build)
+
+
+# parameters makeReleaseStatesResponse matches the response model with
+releaseStatesParameterNames = ['currentBuildState']
+
+
+def makeReleaseStatesResponse(states):
+    messages = []
+    for releaseName, (result, build) in states.items():
+        matchParameters = {'currentBuildState': None if result is None else result.value}
+        message = Common.getMessageFromFile('outputs.yaml', 'checkReleaseStates', matchParameters)
+        messages.append(Common.fillParameters({'releaseName': releaseName, 'build': build}, message))
+    return Common.makeCommonResponse(' '.join(messages))
+
+
+@router.action('check-release-states')
+def checkReleaseStates(req):
+    return makeReleaseStatesResponse(findBuildStates(list(Plans.getPlans().buildNames)))
+
+
+@router.asyncAction('check-release-states')
+async def checkReleaseStatesAsync(req):
+    return makeReleaseStatesResponse(await findBuildStatesAsync(list(Plans.getPlans().buildNames)))
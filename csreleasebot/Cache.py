@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+__refreshExecutor = ThreadPoolExecutor(max_workers=4)
+
+# every live cache, for the metrics endpoint
+caches = weakref.WeakSet()
+
+
+def getRefreshExecutor():
+    return __refreshExecutor
+
+
+class SingleFlight(object):
+    """Runs one call per key at a time, callers asking for the same key meanwhile share its result or exception."""
+
+    def __init__(self):
+        self.calls = {}
+        self.asyncCalls = {}
+        self.lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, function):
+        with self.lock:
+            future = self.calls.get(key)
+            isLeader = future is None
+            if isLeader:
+                future = Future()
+                self.calls[key] = future
+            else:
+                self.coalesced += 1
+        if not isLeader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+        future.set_result(result)
+        return result
+
+    # function returns a coroutine, the task running it is shared by the callers on the same event loop
+    async def doAsync(self, key, function):
+        loop = asyncio.get_event_loop()
+        loopTask = self.asyncCalls.get(key)
+        if loopTask is not None and loopTask[0] is loop:
+            self.coalesced += 1
+            task = loopTask[1]
+        else:
+            task = asyncio.ensure_future(function())
+            self.asyncCalls[key] = (loop, task)
+
+            def done(task):
+                if self.asyncCalls.get(key, (None, None))[1] is task:
+                    del self.asyncCalls[key]
+            task.add_done_callback(done)
+        # a cancelled caller must not cancel the call the others wait for
+        return await asyncio.shield(task)
+
+
+class TTLCache(object):
+    """In-process cache whose entries expire after a per-entry TTL, a TTL of None never expires.
+
+    An expired entry is still served for staleTTL seconds while it is reloaded in the background.
+    """
+
+    def __init__(self, name, staleTTL=0, maxSize=1024, clock=time.time):
+        self.name = name
+        self.staleTTL = staleTTL
+        self.maxSize = maxSize
+        self.clock = clock
+        self.entries = {}
+        self.refreshing = {}
+        self.flights = SingleFlight()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.staleHits = 0
+        self.misses = 0
+        caches.add(self)
+
+    # returns whether the key is cached, its value and whether a refresh of the stale value should start
+    def __lookup(self, key):
+        now = self.clock()
+        with self.lock:
+            cached = key in self.entries
+            value, expiresAt = self.entries.get(key, (None, now))
+            if cached and (expiresAt is None or now < expiresAt):
+                self.hits += 1
+                return True, value, False
+            if cached and now < expiresAt + self.staleTTL:
+                self.staleHits += 1
+                startRefresh = key not in self.refreshing
+                self.refreshing[key] = True
+                return True, value, startRefresh
+            self.misses += 1
+            return False, None, False
+
+    # ttlOf(value) returns the TTL to store the loaded value with, concurrent misses of a key share one load
+    def get(self, key, loader, ttlOf):
+        isCached, value, startRefresh = self.__lookup(key)
+        if not isCached:
+            value = self.flights.do(key, lambda: self.__load(key, loader, ttlOf))
+        elif startRefresh:
+            getRefreshExecutor().submit(self.__refresh, key, loader, ttlOf)
+        return value
+
+    # same as get with a coroutine loader, stale values are refreshed on the running event loop
+    async def getAsync(self, key, loader, ttlOf):
+        isCached, value, startRefresh = self.__lookup(key)
+        if not isCached:
+            value = await self.flights.doAsync(key, lambda: self.__loadAsync(key, loader, ttlOf))
+        elif startRefresh:
+            asyncio.ensure_future(self.__refreshAsync(key, loader, ttlOf))
+        return value
+
+    def __load(self, key, loader, ttlOf):
+        value = loader()
+        self.put(key, value, ttlOf(value))
+        return value
+
+    async def __loadAsync(self, key, loader, ttlOf):
+        value = await loader()
+        self.put(key, value, ttlOf(value))
+        return value
+
+    def __refresh(self, key, loader, ttlOf):
+        try:
+            self.flights.do(key, lambda: self.__load(key, loader, ttlOf))
+        except Exception:
+            logging.exception('Refreshing %s cache entry %s failed', self.name, key)
+        finally:
+            with self.lock:
+                self.refreshing.pop(key, None)
+
+    async def __refreshAsync(self, key, loader, ttlOf):
+        try:
+            await self.flights.doAsync(key, lambda: self.__loadAsync(key, loader, ttlOf))
+        except Exception:
+            logging.exception('Refreshing %s cache entry %s failed', self.name, key)
+        finally:
+            with self.lock:
+                self.refreshing.pop(key, None)
+
+    # returns whether a fresh value is cached and the value, stale values are not served
+    def getIfFresh(self, key):
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[1] is None or now < entry[1]):
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+            return False, None
+
+    def peek(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return entry[0]
+
+    def put(self, key, value, ttl):
+        expiresAt = None if ttl is None else self.clock() + ttl
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, expiresAt)
+            while len(self.entries) > self.maxSize:
+                del self.entries[next(iter(self.entries))]
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.staleHits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'staleHits': self.staleHits, 'misses': self.misses, 'size': len(self.entries)}
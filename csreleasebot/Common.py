@@ -1,13 +1,24 @@
+import logging
 import pytz
 import yaml
+import operator
 import re
 import sys,os
+import threading
 import datetime as dt
 
+from csreleasebot import Metrics
+
+parameterPattern = re.compile(r"\{([A-Za-z0-9_\\.]+)\}")
+
+__templates = {}
+__yamlFiles = {}
+__yamlFilesLock = threading.Lock()
+__compiledModels = {}
+
 
 def makeCommonResponse(speech):
-    print("Response:")
-    print(speech)
+    logging.debug('Response: %s', speech)
 
     return {
         "speech": speech,
@@ -35,40 +46,148 @@ def getParameter(req, contextName, parameterName):
 
 
 def extractParametersFromText(text):
-    return re.findall(r"\{([A-Za-z0-9_\\.]+)\}", text)
+    return parameterPattern.findall(text)
+
 
+# compiled into literal strings and (parameter, name, attribute getter) accessors
+def compileTemplate(text):
+    segments = []
+    position = 0
+    for match in parameterPattern.finditer(text):
+        segments.append(text[position:match.start()])
+        parameter = match.group(1)
+        name, _, attributePath = parameter.partition('.')
+        getter = operator.attrgetter(attributePath) if attributePath else None
+        segments.append((parameter, name, getter))
+        position = match.end()
+    segments.append(text[position:])
+    return segments
 
+
+def getTemplate(text):
+    template = __templates.get(text)
+    if template is None:
+        template = compileTemplate(text)
+        __templates[text] = template
+    return template
+
+
+@Metrics.timed('Common.fillParameters')
 def fillParameters(valuesToFill, text):
-    parameters = extractParametersFromText(text)
-    for parameter in parameters:
-        value = __handleChildParameters(valuesToFill, parameter.split('.'), None)
+    parts = []
+    for segment in getTemplate(text):
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        parameter, name, getter = segment
+        value = valuesToFill.get(name)
+        if getter is not None and value is not None:
+            try:
+                value = getter(value)
+            except AttributeError:
+                value = None
         if callable(value):
             value = value(valuesToFill)
-        if value is not None:
-            text = text.replace('{' + parameter + '}', value)
-    return text
+        if value is None:
+            parts.append('{' + parameter + '}')
+        else:
+            parts.append(str(value))
+    return ''.join(parts)
 
 
-def __handleChildParameters(valuesToFill, parameterParts, child):
-    if len(parameterParts) == 0:
-        return child
-    else:
-        part = parameterParts.pop(0)
-        if child is None:
-            child = valuesToFill.get(part)
-        else:
-            child = child.__dict__.get(part)
-        return __handleChildParameters(valuesToFill, parameterParts, child)
+# parsed once and kept in memory, parsed again only when the file is modified
+def loadYamlFile(fileName):
+    fullFilePath = os.path.join(os.path.dirname(__file__), fileName)
+    modifiedTime = os.path.getmtime(fullFilePath)
+    cached = __yamlFiles.get(fullFilePath)
+    if cached is not None and cached[0] == modifiedTime:
+        return cached[1]
+    with __yamlFilesLock:
+        cached = __yamlFiles.get(fullFilePath)
+        if cached is not None and cached[0] == modifiedTime:
+            return cached[1]
+        with open(fullFilePath, 'r', encoding='utf-8') as yamlFile:
+            content = yaml.safe_load(yamlFile)
+        __yamlFiles[fullFilePath] = (modifiedTime, content)
+        return content
 
 
+@Metrics.timed('Common.getMessageFromFile')
 def getMessageFromFile(fileName, modelName, parameters):
-    fullFilePath = os.path.join(os.path.dirname(__file__), fileName)
-    allModels = yaml.load(open(fullFilePath, 'r'))
-    model = allModels.get(modelName)
-    return __handleItems(model, parameters)
+    level = getCompiledModel(fileName, modelName)
+    while True:
+        msg, level = level.select(parameters)
+        if level is None:
+            return msg
+
 
+# compiled again whenever loadYamlFile returns a reloaded file
+def getCompiledModel(fileName, modelName):
+    allModels = loadYamlFile(fileName)
+    cached = __compiledModels.get(fileName)
+    if cached is None or cached[0] is not allModels:
+        cached = (allModels, {})
+        __compiledModels[fileName] = cached
+    level = cached[1].get(modelName)
+    if level is None:
+        level = CompiledLevel(allModels.get(modelName))
+        cached[1][modelName] = level
+    return level
 
-def __handleItems(model, parameters):
+
+def getItemKeys(item):
+    return [key for key in item if key not in ('sub', 'msg')]
+
+
+class CompiledLevel(object):
+    """One level of a response model, items keyed by the same parameter are indexed by its values.
+
+    Selection picks the same item as scoring every item against every parameter,
+    levels mixing several keys still fall back to that scoring.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.children = []
+        self.key = None
+        self.branches = {}
+        self.defaultIndex = None
+        self.isScored = False
+        for item in model:
+            sub = item.get('sub')
+            self.children.append((item.get('msg'), None if sub is None else CompiledLevel(sub)))
+        for i, item in enumerate(model):
+            itemKeys = getItemKeys(item)
+            if not itemKeys:
+                if self.defaultIndex is None:
+                    self.defaultIndex = i
+                continue
+            if len(itemKeys) > 1 or self.key not in (None, itemKeys[0]):
+                self.isScored = True
+                return
+            self.key = itemKeys[0]
+            itemValue = item.get(self.key)
+            for value in itemValue if isinstance(itemValue, list) else [itemValue]:
+                self.branches.setdefault(value, i)
+
+    def select(self, parameters):
+        if self.isScored:
+            index = scoreItems(self.model, parameters)
+        elif self.key is None or self.key not in parameters:
+            index = 0
+        else:
+            try:
+                index = self.branches.get(parameters.get(self.key))
+            except TypeError:
+                index = scoreItems(self.model, parameters)
+            if index is None:
+                index = self.defaultIndex or 0
+            elif self.defaultIndex is not None:
+                index = min(index, self.defaultIndex)
+        return self.children[index]
+
+
+def scoreItems(model, parameters):
     matchLevel = [None]*len(model)
     for i, item in enumerate(model):
         matchLevel[i] = 0
@@ -81,17 +200,53 @@ def __handleItems(model, parameters):
                         matchLevel[i] += 1000
                 elif parameterValue == itemValue:
                     matchLevel[i] += 1000
-    match = model[matchLevel.index(max(matchLevel))] #TODO: if matchLevel=0 what to do, means default or sth
-    if 'sub' in match:
-        return __handleItems(match.get('sub'), parameters)
-    else:
-        return match.get('msg')
+    return matchLevel.index(max(matchLevel)) #TODO: if matchLevel=0 what to do, means default or sth
+
+
+# returns the problems found in a model, unknown (misspelled) keys and items no parameters can select
+def validateModel(fileName, modelName, parameterNames):
+    problems = []
+    model = loadYamlFile(fileName).get(modelName)
+    if model is None:
+        return ['%s: model not found' % modelName]
+    __validateLevel(model, modelName, parameterNames, problems)
+    return problems
+
+
+def __validateLevel(model, path, parameterNames, problems):
+    levelKeys = set()
+    seenValues = set()
+    defaultSeen = False
+    for i, item in enumerate(model):
+        itemPath = '%s[%d]' % (path, i)
+        itemKeys = getItemKeys(item)
+        for key in itemKeys:
+            if key not in parameterNames:
+                problems.append("%s: unknown key '%s'" % (itemPath, key))
+        levelKeys.update(itemKeys)
+        if 'sub' not in item and 'msg' not in item:
+            problems.append('%s: neither msg nor sub' % itemPath)
+        if defaultSeen:
+            problems.append('%s: unreachable, follows an item without keys' % itemPath)
+        elif not itemKeys:
+            defaultSeen = True
+        elif len(itemKeys) == 1:
+            itemValue = item.get(itemKeys[0])
+            values = set((itemKeys[0], value) for value in (itemValue if isinstance(itemValue, list) else [itemValue]))
+            if values <= seenValues:
+                problems.append('%s: unreachable, its values are matched by earlier items' % itemPath)
+            seenValues |= values
+        if 'sub' in item:
+            __validateLevel(item.get('sub'), itemPath + '.sub', parameterNames, problems)
+    if len(levelKeys) > 1:
+        problems.append('%s: items are keyed by different parameters %s' % (path, sorted(levelKeys)))
 
 
 def printTimeDelta(timeDelta):
     if timeDelta is None:
         return None
-    seconds = timeDelta.seconds
+    # the next build may be days away after a weekend or holiday
+    seconds = timeDelta.seconds + max(timeDelta.days, 0) * 24 * 3600
     hours = int(seconds / 3600)
     seconds %= 3600
     minutes = seconds / 60
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from csreleasebot import Metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+poolSize = int(os.environ.get('HTTP_POOL_SIZE', 10))
+connectTimeout = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+readTimeout = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+retries = int(os.environ.get('HTTP_RETRIES', 2))
+backoffFactor = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.3))
+# the async server keeps many more requests in flight on a single event loop
+asyncPoolSize = int(os.environ.get('HTTP_ASYNC_POOL_SIZE', 100))
+
+JSON_HEADERS = {'content-type': 'application/json', 'Accept': 'application/json', 'Connection': 'keep-alive'}
+
+__sessions = {}
+__sessionsPid = None
+__sessionsLock = threading.Lock()
+__asyncClients = {}
+
+
+def makeSession():
+    retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoffFactor,
+                  status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(JSON_HEADERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# one pooled session per upstream service and per process, sockets must not be shared across a fork
+def getSession(serviceName):
+    global __sessionsPid
+    pid = os.getpid()
+    session = __sessions.get(serviceName)
+    if session is not None and __sessionsPid == pid:
+        return session
+    with __sessionsLock:
+        if __sessionsPid != pid:
+            __sessions.clear()
+            __sessionsPid = pid
+        session = __sessions.get(serviceName)
+        if session is None:
+            session = makeSession()
+            __sessions[serviceName] = session
+        return session
+
+
+# creates the sessions of a freshly forked worker before its first request, their connections are opened on first use
+def warmUp():
+    for serviceName in ('bamboo', 'jira'):
+        getSession(serviceName)
+
+
+def reset():
+    with __sessionsLock:
+        for session in __sessions.values():
+            session.close()
+        __sessions.clear()
+    __asyncClients.clear()
+
+
+def get(serviceName, url, params=None, auth=None):
+    startTime = time.perf_counter()
+    try:
+        return getSession(serviceName).get(url, params=params, auth=auth, timeout=(connectTimeout, readTimeout))
+    finally:
+        Metrics.countUpstreamCall(serviceName, time.perf_counter() - startTime)
+
+
+def makeAsyncClient():
+    if httpx is None:
+        raise RuntimeError('httpx is required for the async server')
+    limits = httpx.Limits(max_connections=asyncPoolSize, max_keepalive_connections=poolSize)
+    return httpx.AsyncClient(headers=JSON_HEADERS,
+                             timeout=httpx.Timeout(readTimeout, connect=connectTimeout),
+                             transport=httpx.AsyncHTTPTransport(retries=retries, limits=limits))
+
+
+# async clients are only used from the event loop thread, so they need no lock
+def getAsyncClient(serviceName):
+    client = __asyncClients.get(serviceName)
+    if client is None:
+        client = makeAsyncClient()
+        __asyncClients[serviceName] = client
+    return client
+
+
+async def closeAsyncClients():
+    clients = list(__asyncClients.values())
+    __asyncClients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+async def getAsync(serviceName, url, params=None, auth=None):
+    startTime = time.perf_counter()
+    try:
+        return await getAsyncClient(serviceName).get(url, params=params, auth=auth)
+    finally:
+        Metrics.countUpstreamCall(serviceName, time.perf_counter() - startTime)
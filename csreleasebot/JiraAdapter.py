@@ -6,20 +6,71 @@ import logging
 
 import dateutil.parser
 import datetime as dt
+import functools
+import math
+import re
+import time
 
 import pytz
-import requests
 
 from csreleasebot import BambooAdapter
+from csreleasebot import Cache
 from csreleasebot import Common
+from csreleasebot import HttpClient
+from csreleasebot import Metrics
+from csreleasebot import Router
+from csreleasebot.Router import router
 
-jiraBaseURL = "http://issues.orioncb.com/rest/api/2/"
+jiraBaseURL = os.environ.get("JIRA_BASE_URL", "http://issues.orioncb.com/rest/api/2/")
 
 JIRA_USER = os.environ['BAMBOO_USER']
 JIRA_PASS = os.environ['BAMBOO_PASS']
 
+# fields each intent reads, the changelog is only expanded when a transition date is asked for
+stateFields = ['status', 'updated']
+deploymentFields = ['status', 'updated', 'resolution', 'resolutiondate', 'issuelinks', 'customfield_10500']
+searchBatchSize = 50
+# bulk deployment checks page through search results, checking at most bulkIssueLimit issues
+searchPageSize = int(os.environ.get('ISSUE_SEARCH_PAGE_SIZE', 100))
+bulkIssueLimit = int(os.environ.get('ISSUE_BULK_LIMIT', 200))
+issueKeyPattern = re.compile(r'^[A-Z][A-Z0-9_]*-[0-9]+$')
+
+# cached issues are used as they are for issueCacheTTL seconds, then revalidated against their updated field,
+# closed release issues never change
+issueCacheTTL = float(os.environ.get('ISSUE_CACHE_TTL', 30))
+issueCache = Cache.TTLCache('issue', maxSize=int(os.environ.get('ISSUE_CACHE_SIZE', 4096)))
+# issues pushed by the Jira webhook stay current until the next push, they are only revalidated after this
+issuePushTTL = float(os.environ.get('ISSUE_PUSH_TTL', 600))
+# concurrent loads of the same issue share one Jira request
+issueFlights = Cache.SingleFlight()
+
+# issue answers are served again to the same question for a few seconds
+responseCacheTTL = float(os.environ.get('ISSUE_RESPONSE_CACHE_TTL', 10))
+issueStateResponseCache = Router.CacheMiddleware('issueStateResponse', responseCacheTTL)
+issueDeploymentResponseCache = Router.CacheMiddleware('issueDeploymentResponse', responseCacheTTL)
+
+
+def getIssueFlightKey(issueNo, fields, expand):
+    return issueNo, tuple(fields) if fields is not None else None, expand
+
+
+# caches the result of an Issue method in issue.memo, which is emptied whenever the issue is assigned new values
+def memoized(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def memoizedMethod(self):
+        if name not in self.memo:
+            value = method(self)
+            self.memo[name] = value
+        return self.memo[name]
+    return memoizedMethod
+
 
 class Issue(object):
+    __slots__ = ('key', 'id', 'statusName', 'statusCategoryId', 'resolutionName', 'resolutionId', 'links', 'resolutionDate',
+                 'changelog', 'changelogLoaded', 'deploymentTimeSelection', 'updated', 'loadedFields', 'validatedAt',
+                 'linkGroup', 'isInit', 'memo')
 
     def __init__(self):
         self.key = None
@@ -31,17 +82,102 @@ class Issue(object):
         self.links = []
         self.resolutionDate = None
         self.changelog = []
+        self.changelogLoaded = False
         self.deploymentTimeSelection = None
+        self.updated = None
+        self.loadedFields = None
+        self.validatedAt = None
+        self.linkGroup = None
         self.isInit = False
+        self.memo = {}
 
     @classmethod
-    def fromIssueNo(cls, issueNo):
-        issueJSON = Issue.getIssueJSON(issueNo)
+    def fromIssueNo(cls, issueNo, fields=deploymentFields, expand=None):
+        cachedIssue, isFresh = Issue.getCachedIssue(issueNo, fields, expand)
+        if cachedIssue is not None and not isFresh:
+            updatedJSON = issueFlights.do((issueNo, 'updated'), lambda: Issue.getIssueJSON(issueNo, ['updated']))
+            isFresh = Issue.revalidate(cachedIssue, updatedJSON)
+        if isFresh:
+            return cachedIssue.copy()
+
+        def load():
+            return Issue.cacheIssue(Issue.fromLoadedIssueJSON(Issue.getIssueJSON(issueNo, fields, expand), fields))
+        return issueFlights.do(getIssueFlightKey(issueNo, fields, expand), load).copy()
+
+    @classmethod
+    async def fromIssueNoAsync(cls, issueNo, fields=deploymentFields, expand=None):
+        cachedIssue, isFresh = Issue.getCachedIssue(issueNo, fields, expand)
+        if cachedIssue is not None and not isFresh:
+            updatedJSON = await issueFlights.doAsync((issueNo, 'updated'), lambda: Issue.getIssueJSONAsync(issueNo, ['updated']))
+            isFresh = Issue.revalidate(cachedIssue, updatedJSON)
+        if isFresh:
+            return cachedIssue.copy()
+
+        async def load():
+            return Issue.cacheIssue(Issue.fromLoadedIssueJSON(await Issue.getIssueJSONAsync(issueNo, fields, expand), fields))
+        return (await issueFlights.doAsync(getIssueFlightKey(issueNo, fields, expand), load)).copy()
+
+    @classmethod
+    def fromLoadedIssueJSON(cls, issueJSON, fields=None):
         issue = Issue.fromIssueJSON(issueJSON)
         issue.links = Issue.getIssueLinksFromIssueJSON(issueJSON)
+        issue.loadedFields = fields
         issue.isInit = True
         return issue
 
+    # takes over the state of a loaded issue, a stub becomes a plain Issue
+    def assign(self, issue):
+        self.__class__ = Issue
+        for name in Issue.__slots__:
+            setattr(self, name, getattr(issue, name))
+        self.memo = {}
+
+    # a loaded issue with the same values, its links are stubs again so they are resolved through the cache
+    def copy(self):
+        issue = Issue()
+        issue.assign(self)
+        issue.changelog = list(self.changelog)
+        issue.links = []
+        for link in self.links:
+            issue.links.append(IssueStub(link.key, link.id, link.statusName, link.statusCategoryId, issue.links))
+        return issue
+
+    def covers(self, fields, expand):
+        if expand == 'changelog' and not self.changelogLoaded:
+            return False
+        return self.loadedFields is None or fields is not None and set(fields) <= set(self.loadedFields)
+
+    def isImmutable(self):
+        return self.getProjectKey() == 'CDBR' and self.statusCategoryId == 3
+
+    @staticmethod
+    def cacheIssue(issue, ttl=None):
+        issue.validatedAt = time.time()
+        if issue.isImmutable():
+            ttl = None
+        elif ttl is None:
+            ttl = issueCacheTTL
+        issueCache.put(issue.key, issue, ttl)
+        return issue
+
+    # returns the cached issue having the fields and whether it can be used without revalidation
+    @staticmethod
+    def getCachedIssue(issueNo, fields, expand):
+        isFresh, issue = issueCache.getIfFresh(issueNo)
+        if not isFresh:
+            issue = issueCache.peek(issueNo)
+        if issue is None or not issue.covers(fields, expand):
+            return None, False
+        return issue, isFresh
+
+    @staticmethod
+    def revalidate(cachedIssue, updatedJSON):
+        fields = updatedJSON.get('fields')
+        if fields is None or fields.get('updated') != cachedIssue.updated:
+            return False
+        Issue.cacheIssue(cachedIssue)
+        return True
+
     @classmethod
     def fromIssueJSON(cls, issueJSON):
         issue = Issue()
@@ -60,46 +196,196 @@ class Issue(object):
             issue.resolutionName = resolution.get('name')
             issue.resolutionId = int(resolution.get('id'))
 
+        issue.updated = fields.get('updated')
+
         deploymentTimeSelection = fields.get('customfield_10500')
         if deploymentTimeSelection is not None:
             issue.deploymentTimeSelection = deploymentTimeSelection.get('value')
 
         changelog = issueJSON.get('changelog')
         if changelog is not None:
+            issue.changelogLoaded = True
             histories = changelog.get('histories')
             for history in histories:
-                items = history.get('items')
-                for item in items:
-                    issue.changelog.append({'changeDate': history.get('created'), 'item': item})
+                changeDate = dateutil.parser.parse(history.get('created'))
+                for item in history.get('items'):
+                    issue.changelog.append({'changeDate': changeDate, 'item': item})
         return issue
 
-    # fills sub variables if didnt exist at the creation
-    def __getattribute__(self, name):
-        if not super(Issue, self).__getattribute__('isInit'):
-            val = super(Issue, self).__getattribute__(name)
-            if val is None:
-                self.__dict__.update(self.fromIssueNo(self.key).__dict__)
-                print("INIT!")
-                return super(Issue, self).__getattribute__(name)
-            return val
-        return super(Issue, self).__getattribute__(name)
+    # fills the issue with all of its sibling links at once, without loadMissing the issues the search
+    # could not return are left as they are
+    @classmethod
+    def loadIssues(cls, issues, loadMissing=True):
+        pendingIssues = Issue.getPendingIssues(issues)
+        staleIssues = Issue.applyCachedIssues(pendingIssues)
+        for jql, batchKeys in Issue.getLoadQueries(pendingIssues, staleIssues):
+            searchJSON = Issue.searchIssuesJSON(jql, deploymentFields, 0, len(batchKeys), validateQuery='warn')
+            if not Issue.applySearchJSON(pendingIssues, staleIssues, batchKeys, searchJSON) and not loadMissing:
+                Issue.checkSearchJSON(searchJSON)
+        Issue.applyUnchangedIssues(pendingIssues, staleIssues)
+        # keys the search could not return are loaded one by one
+        for key, keyIssues in pendingIssues.items() if loadMissing else ():
+            Issue.applyLoadedIssue(keyIssues, Issue.fromIssueNo(key))
+
+    @classmethod
+    async def loadIssuesAsync(cls, issues, loadMissing=True):
+        pendingIssues = Issue.getPendingIssues(issues)
+        staleIssues = Issue.applyCachedIssues(pendingIssues)
+        for jql, batchKeys in Issue.getLoadQueries(pendingIssues, staleIssues):
+            searchJSON = await Issue.searchIssuesJSONAsync(jql, deploymentFields, 0, len(batchKeys), validateQuery='warn')
+            if not Issue.applySearchJSON(pendingIssues, staleIssues, batchKeys, searchJSON) and not loadMissing:
+                Issue.checkSearchJSON(searchJSON)
+        Issue.applyUnchangedIssues(pendingIssues, staleIssues)
+        for key, keyIssues in pendingIssues.items() if loadMissing else ():
+            Issue.applyLoadedIssue(keyIssues, await Issue.fromIssueNoAsync(key))
+
+    # returns the first limit issues the JQL finds and how many it finds in total, a page at a time
+    @classmethod
+    def searchIssues(cls, jql, limit=None):
+        issues = []
+        total = None
+        while True:
+            page = Issue.getNextSearchPage(issues, total, limit)
+            if page is None:
+                return issues, total or 0
+            total = Issue.applySearchPage(issues, Issue.searchIssuesJSON(jql, deploymentFields, *page))
 
+    @classmethod
+    async def searchIssuesAsync(cls, jql, limit=None):
+        issues = []
+        total = None
+        while True:
+            page = Issue.getNextSearchPage(issues, total, limit)
+            if page is None:
+                return issues, total or 0
+            total = Issue.applySearchPage(issues, await Issue.searchIssuesJSONAsync(jql, deploymentFields, *page))
+
+    # returns startAt and maxResults of the next page, None when the search is done
+    @staticmethod
+    def getNextSearchPage(issues, total, limit):
+        limit = bulkIssueLimit if limit is None else limit
+        if len(issues) >= limit or total is not None and len(issues) >= total:
+            return None
+        return len(issues), min(searchPageSize, limit - len(issues))
+
+    # returns the total of the search, an empty page ends it
+    @staticmethod
+    def applySearchPage(issues, searchJSON):
+        Issue.checkSearchJSON(searchJSON)
+        issuesJSON = searchJSON.get('issues')
+        for issueJSON in issuesJSON:
+            issues.append(Issue.cacheIssue(Issue.fromLoadedIssueJSON(issueJSON, deploymentFields)).copy())
+        if not issuesJSON:
+            return len(issues)
+        return searchJSON.get('total', len(issues))
+
+    # returns the latest release link of every issue that is not loaded yet
+    @staticmethod
+    def getReleaseIssues(issues):
+        releaseIssues = []
+        for issue in issues:
+            releaseIssue = issue.getLastReleaseIssue()
+            if releaseIssue is not None and not releaseIssue.isInit:
+                releaseIssues.append(releaseIssue)
+        return releaseIssues
+
+    # issues sharing a release share its lookup, all releases are loaded with one search
+    @classmethod
+    def loadReleaseIssues(cls, issues):
+        Issue.loadIssues(Issue.getReleaseIssues(issues))
+
+    @classmethod
+    async def loadReleaseIssuesAsync(cls, issues):
+        await Issue.loadIssuesAsync(Issue.getReleaseIssues(issues))
+
+    # returns the issues to load by key, an issue linked twice has a stub for each link
+    @staticmethod
+    def getPendingIssues(issues):
+        pendingIssues = {}
+        for issue in issues:
+            if not issue.isInit:
+                pendingIssues.setdefault(issue.key, []).append(issue)
+        return pendingIssues
+
+    @staticmethod
+    def applyLoadedIssue(keyIssues, loadedIssue):
+        for issue in keyIssues:
+            issue.assign(loadedIssue.copy())
+
+    # fills the pending issues that are fresh in the cache, returns the cached ones that need revalidation
+    @staticmethod
+    def applyCachedIssues(pendingIssues):
+        staleIssues = {}
+        for key in list(pendingIssues):
+            cachedIssue, isFresh = Issue.getCachedIssue(key, deploymentFields, None)
+            if isFresh:
+                Issue.applyLoadedIssue(pendingIssues.pop(key), cachedIssue)
+            elif cachedIssue is not None:
+                staleIssues[key] = cachedIssue
+        return staleIssues
+
+    # stale issues are only returned by the search when they were updated since they were last validated
+    @staticmethod
+    def getLoadQueries(pendingIssues, staleIssues):
+        loadQueries = []
+        unknownKeys = [key for key in pendingIssues if key not in staleIssues]
+        for i in range(0, len(unknownKeys), searchBatchSize):
+            batchKeys = unknownKeys[i:i + searchBatchSize]
+            loadQueries.append(('key in (%s)' % ','.join(batchKeys), batchKeys))
+        staleKeys = list(staleIssues)
+        for i in range(0, len(staleKeys), searchBatchSize):
+            batchKeys = staleKeys[i:i + searchBatchSize]
+            validatedAt = min(staleIssues[key].validatedAt for key in batchKeys)
+            minutes = int(math.ceil((time.time() - validatedAt) / 60.0)) + 1
+            loadQueries.append(('key in (%s) AND updated >= "-%dm"' % (','.join(batchKeys), minutes), batchKeys))
+        return loadQueries
+
+    # Jira answers a rejected search, a bad query or missing permissions, with errorMessages and no issues
+    @staticmethod
+    def isSearchFailed(searchJSON):
+        return 'issues' not in searchJSON or bool(searchJSON.get('errorMessages'))
+
+    # a failed search must not be answered as if it found nothing
+    @staticmethod
+    def checkSearchJSON(searchJSON):
+        if Issue.isSearchFailed(searchJSON):
+            raise RuntimeError('Jira search failed: %s' % searchJSON.get('errorMessages'))
+
+    # fills the pending issues found in the search result and removes them from pendingIssues, returns False when it failed,
+    # stale issues of a failed search are not known to be unchanged, so they are loaded again instead
+    @staticmethod
+    def applySearchJSON(pendingIssues, staleIssues, batchKeys, searchJSON):
+        if Issue.isSearchFailed(searchJSON):
+            logging.warning('Search for %s failed: %s', ','.join(batchKeys), searchJSON.get('errorMessages'))
+            for key in batchKeys:
+                staleIssues.pop(key, None)
+            return False
+        for issueJSON in searchJSON.get('issues'):
+            keyIssues = pendingIssues.pop(issueJSON.get('key'), None)
+            if keyIssues is not None:
+                Issue.applyLoadedIssue(keyIssues, Issue.cacheIssue(Issue.fromLoadedIssueJSON(issueJSON, deploymentFields)))
+        return True
+
+    @staticmethod
+    def applyUnchangedIssues(pendingIssues, staleIssues):
+        for key, cachedIssue in staleIssues.items():
+            keyIssues = pendingIssues.pop(key, None)
+            if keyIssues is not None:
+                Issue.applyLoadedIssue(keyIssues, Issue.cacheIssue(cachedIssue))
+
+    # a release issue is its own release, otherwise the highest numbered release link or None
+    @memoized
     def getLastReleaseIssue(self):
         if self.getProjectKey() == 'CDBR':
             return self
-        releaseIssueLinks = []
-        for issueLink in self.links:
-            if issueLink.getProjectKey() == 'CDBR':
-                releaseIssueLinks.append(issueLink)
-        releaseIssueLinks.sort(key=lambda x: x.key, reverse=True)
-        if not releaseIssueLinks:
-            return None
-        return releaseIssueLinks[0]
+        releaseIssueLinks = (issueLink for issueLink in self.links if issueLink.getProjectKey() == 'CDBR')
+        return max(releaseIssueLinks, key=lambda issueLink: Issue.getIssueNumberFromIssueNo(issueLink.key), default=None)
 
     def getProjectKey(self):
         return Issue.getIssueProjectKeyFromIssueNo(self.key)
 
     @property
+    @memoized
     def isDeployed(self):
         if self.getProjectKey() == 'CDBR':
             return self.statusCategoryId == 3 and self.resolutionId == 1
@@ -111,6 +397,7 @@ class Issue(object):
                 return lastReleaseIssue.isDeployed
 
     @property
+    @memoized
     def deploymentDate(self):
         if self.isDeployed:
             if self.getProjectKey() == 'CDBR':
@@ -121,6 +408,7 @@ class Issue(object):
         else:
             return None
 
+    # depends on the current time, so it is not memoized
     @property
     def timeToNextDeployment(self):
         lastReleaseIssue = self.getLastReleaseIssue()
@@ -135,27 +423,77 @@ class Issue(object):
         else:
             return None
 
+    def loadChangelog(self):
+        issueJSON = Issue.getIssueJSON(self.key, stateFields, 'changelog')
+        self.changelog = Issue.fromIssueJSON(issueJSON).changelog
+        self.changelogLoaded = True
+        self.memo.pop('lastTransitionDate', None)
+
     @property
+    @memoized
     def lastTransitionDate(self):
-        statusChangeDates = []
-        for change in self.changelog:
-            if change.get('item').get('field') == 'status':
-                statusChangeDates.append(dateutil.parser.parse(change.get('changeDate')))
+        if not self.changelogLoaded:
+            self.loadChangelog()
+        statusChangeDates = [change.get('changeDate') for change in self.changelog if change.get('item').get('field') == 'status']
+        return max(statusChangeDates, default=None)
 
-        if len(statusChangeDates) == 0:
-            return None
-        else:
-            statusChangeDates.sort(reverse=True)
-            return statusChangeDates[0]
+    # fields=None returns every field of the issue
+    @staticmethod
+    def getIssueQuery(issueNo, fields, expand):
+        queryURL = jiraBaseURL + "issue/" + str(issueNo)
+        params = {}
+        if fields is not None:
+            params['fields'] = ','.join(fields)
+        if expand is not None:
+            params['expand'] = expand
+        return queryURL, params
+
+    @staticmethod
+    @Metrics.timed('JiraAdapter.Issue.getIssueJSON')
+    def getIssueJSON(issueNo, fields=None, expand=None):
+        queryURL, params = Issue.getIssueQuery(issueNo, fields, expand)
+        jiraQueryResult = HttpClient.get('jira', queryURL, params=params, auth=(JIRA_USER, JIRA_PASS))
+        issueJSON = json.loads(jiraQueryResult.text)
+        logging.debug(issueJSON)
+        return issueJSON
 
     @staticmethod
-    def getIssueJSON(issueNo):
-        queryURL = jiraBaseURL + "issue/" + str(issueNo) + '?expand=changelog'
-        jiraQueryResult = requests.get(queryURL, headers={'content-type': 'application/json', 'Accept': 'application/json'}, auth=(JIRA_USER, JIRA_PASS))
+    @Metrics.timed('JiraAdapter.Issue.getIssueJSON')
+    async def getIssueJSONAsync(issueNo, fields=None, expand=None):
+        queryURL, params = Issue.getIssueQuery(issueNo, fields, expand)
+        jiraQueryResult = await HttpClient.getAsync('jira', queryURL, params=params, auth=(JIRA_USER, JIRA_PASS))
         issueJSON = json.loads(jiraQueryResult.text)
         logging.debug(issueJSON)
         return issueJSON
 
+    # with validateQuery='warn' unknown keys in a key in (...) search are left out of the result instead of failing
+    # the whole search, queries given by the user are validated strictly so an invalid one is reported
+    @staticmethod
+    def getSearchQuery(jql, fields, startAt, maxResults, validateQuery=None):
+        queryURL = jiraBaseURL + "search"
+        params = {'jql': jql, 'fields': ','.join(fields), 'startAt': startAt, 'maxResults': maxResults}
+        if validateQuery is not None:
+            params['validateQuery'] = validateQuery
+        return queryURL, params
+
+    @staticmethod
+    @Metrics.timed('JiraAdapter.Issue.searchIssuesJSON')
+    def searchIssuesJSON(jql, fields, startAt, maxResults, validateQuery=None):
+        queryURL, params = Issue.getSearchQuery(jql, fields, startAt, maxResults, validateQuery)
+        jiraQueryResult = HttpClient.get('jira', queryURL, params=params, auth=(JIRA_USER, JIRA_PASS))
+        searchJSON = json.loads(jiraQueryResult.text)
+        logging.debug(searchJSON)
+        return searchJSON
+
+    @staticmethod
+    @Metrics.timed('JiraAdapter.Issue.searchIssuesJSON')
+    async def searchIssuesJSONAsync(jql, fields, startAt, maxResults, validateQuery=None):
+        queryURL, params = Issue.getSearchQuery(jql, fields, startAt, maxResults, validateQuery)
+        jiraQueryResult = await HttpClient.getAsync('jira', queryURL, params=params, auth=(JIRA_USER, JIRA_PASS))
+        searchJSON = json.loads(jiraQueryResult.text)
+        logging.debug(searchJSON)
+        return searchJSON
+
     @staticmethod
     def getIssueLinks(issueNo):
         issueJSON = Issue.getIssueJSON(issueNo)
@@ -163,7 +501,7 @@ class Issue(object):
 
     @staticmethod
     def getIssueLinksFromIssueJSON(issueJSON):
-        issueLinks = issueJSON.get('fields').get('issuelinks')
+        issueLinks = issueJSON.get('fields').get('issuelinks', [])
         linkedIssuesList = []
         for issueLink in issueLinks:
             inwardIssue = issueLink.get('inwardIssue')
@@ -171,42 +509,142 @@ class Issue(object):
             linkedIssue = inwardIssue
             if linkedIssue is None:
                 linkedIssue = outwardIssue
-            issue = Issue.fromIssueJSON(linkedIssue)
-            linkedIssuesList.append(issue)
+            status = linkedIssue.get('fields').get('status')
+            linkedIssuesList.append(IssueStub(linkedIssue.get('key'), linkedIssue.get('id'), status.get('name'),
+                                              status.get('statusCategory').get('id'), linkedIssuesList))
         return linkedIssuesList
 
     @staticmethod
     def getIssueProjectKeyFromIssueNo(issueNo):
         return issueNo.split('-')[0]
 
+    # CDBR-1000 is a later release than CDBR-999
+    @staticmethod
+    def getIssueNumberFromIssueNo(issueNo):
+        try:
+            return int(issueNo.rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            return -1
+
 
-def checkIssueState(req):
+class LazyField(object):
+    """Field of an IssueStub, reading it loads the stub."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, issue, owner=None):
+        if issue is None:
+            return self
+        issue.load()
+        return getattr(issue, self.name)
+
+
+class IssueStub(Issue):
+    """Linked issue known only by its key and status, it turns into a plain Issue when a lazy field is read."""
+    __slots__ = ()
+
+    resolutionName = LazyField()
+    resolutionId = LazyField()
+    resolutionDate = LazyField()
+    deploymentTimeSelection = LazyField()
+    updated = LazyField()
+
+    def __init__(self, key, id, statusName, statusCategoryId, linkGroup):
+        self.key = key
+        self.id = id
+        self.statusName = statusName
+        self.statusCategoryId = statusCategoryId
+        self.links = []
+        self.changelog = []
+        self.changelogLoaded = False
+        self.loadedFields = None
+        self.validatedAt = None
+        self.linkGroup = linkGroup
+        self.isInit = False
+        self.memo = {}
+
+    # loads the stub with all of its sibling links at once
+    def load(self):
+        Issue.loadIssues(self.linkGroup)
+        logging.debug('Lazily loaded %s', self.key)
+
+
+pushEvents = ('jira:issue_created', 'jira:issue_updated')
+
+
+# the Jira webhook posts the issue with all of its fields, returns False for unknown payloads
+def applyIssuePush(pushJSON):
+    pushJSON = pushJSON or {}
+    event = pushJSON.get('webhookEvent')
+    issueJSON = pushJSON.get('issue')
+    if not isinstance(issueJSON, dict) or issueJSON.get('key') is None:
+        return False
+    if event == 'jira:issue_deleted':
+        issueCache.invalidate(issueJSON.get('key'))
+    elif event in pushEvents and isinstance(issueJSON.get('fields'), dict):
+        Issue.cacheIssue(Issue.fromLoadedIssueJSON(issueJSON), issuePushTTL)
+    else:
+        return False
+    # responses are cached by request, so any of them may mention the pushed issue
+    issueStateResponseCache.cache.clear()
+    issueDeploymentResponseCache.cache.clear()
+    logging.info('Issue %s pushed by %s', issueJSON.get('key'), event)
+    return True
+
+
+def getIssueStateParameters(req):
     result = req.get("result")
     parameters = result.get('parameters')
 
     if parameters is None:
-        return {}
+        return None
 
-    issueNo = Common.getParameter(req, None, 'issueNo')
-    issue = Issue.fromIssueNo(issueNo)
+    return Common.getParameter(req, None, 'issueNo')
+
+
+def makeIssueStateResponse(issue):
     speech = '%s is %s.' % (issue.key, issue.statusName)
 
     return Common.makeCommonResponse(speech)
 
 
-def checkIssueDeploymentState(req):
+@router.action('check-issue-state', middlewares=[issueStateResponseCache])
+def checkIssueState(req):
+    issueNo = getIssueStateParameters(req)
+    if issueNo is None:
+        return {}
+    return makeIssueStateResponse(Issue.fromIssueNo(issueNo, stateFields))
+
+
+@router.asyncAction('check-issue-state', middlewares=[issueStateResponseCache])
+async def checkIssueStateAsync(req):
+    issueNo = getIssueStateParameters(req)
+    if issueNo is None:
+        return {}
+    return makeIssueStateResponse(await Issue.fromIssueNoAsync(issueNo, stateFields))
+
+
+# parameters checkIssueDeploymentState matches the response model with
+issueDeploymentParameterNames = ['isDeployed', 'tense', 'hasRelease', 'isScheduled']
+
+
+def getIssueDeploymentParameters(req):
     result = req.get("result")
     parameters = result.get('parameters')
 
     if parameters is None:
-        return {}
+        return None
 
     issueNo = Common.getParameter(req, None, 'issueNo')
     tense = Common.getParameter(req, None, 'tense')
+    return issueNo, tense
 
-    issue = Issue.fromIssueNo(issueNo)
 
-    matchParameters = {'isDeployed': issue.isDeployed, 'tense': tense}
+def getIssueDeploymentMessage(issue, tense):
+    timeToNextDeployment = issue.timeToNextDeployment
+    matchParameters = {'isDeployed': issue.isDeployed, 'tense': tense, 'hasRelease': issue.getLastReleaseIssue() is not None,
+                       'isScheduled': timeToNextDeployment is not None}
 
     message = Common.getMessageFromFile('outputs.yaml', 'checkIssueDeployment', matchParameters)
 
@@ -214,8 +652,127 @@ def checkIssueDeploymentState(req):
     if deploymentDate is not None:
         deploymentDate = Common.printDateTime(deploymentDate)
 
-    message = Common.fillParameters({'issueNo': issue.key, 'deploymentDate': deploymentDate, 'nextDeploymentDate': Common.printTimeDelta(issue.timeToNextDeployment)}, message)
+    return Common.fillParameters({'issueNo': issue.key, 'deploymentDate': deploymentDate, 'nextDeploymentDate': Common.printTimeDelta(timeToNextDeployment)}, message)
+
 
-    speech = message
+def makeIssueDeploymentResponse(issue, tense):
+    speech = getIssueDeploymentMessage(issue, tense)
 
     return Common.makeCommonResponse(speech)
+
+
+@router.action('check-issue-deployment', middlewares=[issueDeploymentResponseCache])
+def checkIssueDeploymentState(req):
+    issueDeploymentParameters = getIssueDeploymentParameters(req)
+    if issueDeploymentParameters is None:
+        return {}
+    issueNo, tense = issueDeploymentParameters
+
+    issue = Issue.fromIssueNo(issueNo)
+    # link statuses are copied from the issue when it was loaded, the release is read through the issue cache
+    if issue.getLastReleaseIssue() not in (None, issue):
+        Issue.loadIssues(issue.links)
+
+    return makeIssueDeploymentResponse(issue, tense)
+
+
+@router.asyncAction('check-issue-deployment', middlewares=[issueDeploymentResponseCache])
+async def checkIssueDeploymentStateAsync(req):
+    issueDeploymentParameters = getIssueDeploymentParameters(req)
+    if issueDeploymentParameters is None:
+        return {}
+    issueNo, tense = issueDeploymentParameters
+
+    issue = await Issue.fromIssueNoAsync(issueNo)
+    # release links are loaded up front through the issue cache, so the response is built without blocking the event loop
+    if issue.getLastReleaseIssue() not in (None, issue):
+        await Issue.loadIssuesAsync(issue.links)
+
+    return makeIssueDeploymentResponse(issue, tense)
+
+
+# issueNos is a list or a comma or space separated text of keys, jql is used when no keys are given
+def getIssuesDeploymentParameters(req):
+    result = req.get("result")
+    parameters = result.get('parameters')
+
+    if parameters is None:
+        return None
+
+    issueNos = Common.getParameter(req, None, 'issueNos')
+    if isinstance(issueNos, str):
+        issueNos = re.split(r'[\s,]+', issueNos)
+    issueNos = list(dict.fromkeys(issueNo.strip().upper() for issueNo in issueNos or () if issueNo.strip()))
+    jql = Common.getParameter(req, None, 'jql')
+    if not issueNos and not jql:
+        return None
+    tense = Common.getParameter(req, None, 'tense')
+    return issueNos, jql, tense
+
+
+# keys that are not issue keys are reported as not found instead of breaking the search
+def getIssueStubs(issueNos):
+    stubs = []
+    for issueNo in issueNos[:bulkIssueLimit]:
+        if issueKeyPattern.match(issueNo):
+            stubs.append(IssueStub(issueNo, None, None, None, stubs))
+    return stubs
+
+
+def getFoundIssues(issueNos, stubs):
+    issues = [stub for stub in stubs if stub.isInit]
+    foundKeys = set(issue.key for issue in issues)
+    missingKeys = [issueNo for issueNo in issueNos[:bulkIssueLimit] if issueNo not in foundKeys]
+    return issues, missingKeys, len(issueNos)
+
+
+def makeIssuesDeploymentResponse(issues, missingKeys, total, tense):
+    deployedCount = sum(1 for issue in issues if issue.isDeployed)
+    messages = ['%d of %d issues are Deployed.' % (deployedCount, len(issues))]
+    checkedCount = len(issues) + len(missingKeys)
+    if total > checkedCount:
+        messages.append('Only the first %d of %d issues are checked.' % (checkedCount, total))
+    for issue in issues:
+        messages.append(getIssueDeploymentMessage(issue, tense))
+    if missingKeys:
+        messages.append('%s not found.' % ', '.join(missingKeys))
+    return Common.makeCommonResponse(' '.join(messages))
+
+
+@router.action('check-issues-deployment', middlewares=[issueDeploymentResponseCache])
+def checkIssuesDeploymentState(req):
+    issuesDeploymentParameters = getIssuesDeploymentParameters(req)
+    if issuesDeploymentParameters is None:
+        return {}
+    issueNos, jql, tense = issuesDeploymentParameters
+
+    if issueNos:
+        stubs = getIssueStubs(issueNos)
+        Issue.loadIssues(stubs, loadMissing=False)
+        issues, missingKeys, total = getFoundIssues(issueNos, stubs)
+    else:
+        issues, total = Issue.searchIssues(jql)
+        missingKeys = []
+    Issue.loadReleaseIssues(issues)
+
+    return makeIssuesDeploymentResponse(issues, missingKeys, total, tense)
+
+
+@router.asyncAction('check-issues-deployment', middlewares=[issueDeploymentResponseCache])
+async def checkIssuesDeploymentStateAsync(req):
+    issuesDeploymentParameters = getIssuesDeploymentParameters(req)
+    if issuesDeploymentParameters is None:
+        return {}
+    issueNos, jql, tense = issuesDeploymentParameters
+
+    if issueNos:
+        stubs = getIssueStubs(issueNos)
+        await Issue.loadIssuesAsync(stubs, loadMissing=False)
+        issues, missingKeys, total = getFoundIssues(issueNos, stubs)
+    else:
+        issues, total = await Issue.searchIssuesAsync(jql)
+        missingKeys = []
+    # releases are loaded up front so the response is built without blocking the event loop
+    await Issue.loadReleaseIssuesAsync(issues)
+
+    return makeIssuesDeploymentResponse(issues, missingKeys, total, tense)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+
+logLevel = os.environ.get('LOG_LEVEL', 'INFO')
+# share of full request payloads logged at INFO, all of them are logged at DEBUG
+payloadSampleRate = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', 0.01))
+
+logger = logging.getLogger('csreleasebot')
+
+__listener = None
+__listenerPid = None
+__queueHandler = None
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            entry['payload'] = payload
+        exceptionText = record.exc_text
+        if record.exc_info:
+            exceptionText = self.formatException(record.exc_info)
+        if exceptionText:
+            entry['exception'] = exceptionText
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class PayloadQueueHandler(QueueHandler):
+
+    # only the message and exception text are rendered here, JsonFormatter runs on the listener thread
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# log records go through a queue to a listener thread, so request threads never wait on stdout
+def setupLogging():
+    global __listener, __listenerPid, __queueHandler
+    pid = os.getpid()
+    if __listenerPid == pid:
+        return
+    rootLogger = logging.getLogger()
+    if __queueHandler is not None:
+        rootLogger.removeHandler(__queueHandler)
+    logQueue = queue.Queue(-1)
+    streamHandler = logging.StreamHandler(sys.stdout)
+    streamHandler.setFormatter(JsonFormatter())
+    __listener = QueueListener(logQueue, streamHandler)
+    __listener.start()
+    __listenerPid = pid
+    __queueHandler = PayloadQueueHandler(logQueue)
+    rootLogger.addHandler(__queueHandler)
+    rootLogger.setLevel(logLevel)
+    atexit.register(__listener.stop)
+
+
+def logPayload(message, payload):
+    if logger.isEnabledFor(logging.DEBUG) or (logger.isEnabledFor(logging.INFO) and random.random() < payloadSampleRate):
+        logger.info(message, extra={'payload': payload})
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import functools
+import inspect
+import threading
+import time
+
+try:
+    import contextvars
+except ImportError:  # python 3.6, upstream calls are then counted per thread and only for sync dispatch
+    contextvars = None
+
+from csreleasebot import Cache
+from csreleasebot import Router
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50)
+
+__metrics = []
+
+
+def formatLabels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels)
+
+
+# metrics are rendered from the registry they are created in, a metric given a registry of its own stays out of /metrics
+class Counter(object):
+
+    def __init__(self, name, documentation, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+        register(self, registry)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s counter' % self.name]
+        for key, value in sorted(self.values.items()):
+            lines.append('%s%s %s' % (self.name, formatLabels(key), value))
+        return lines
+
+
+class Histogram(object):
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        register(self, registry)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            for bucket, bucketCount in zip(self.buckets, counts):
+                lines.append('%s_bucket%s %d' % (self.name, formatLabels(key + (('le', bucket),)), bucketCount))
+            lines.append('%s_bucket%s %d' % (self.name, formatLabels(key + (('le', '+Inf'),)), count))
+            lines.append('%s_sum%s %f' % (self.name, formatLabels(key), total))
+            lines.append('%s_count%s %d' % (self.name, formatLabels(key), count))
+        return lines
+
+
+def register(metric, registry=None):
+    (__metrics if registry is None else registry).append(metric)
+
+
+requestDuration = Histogram('csreleasebot_request_duration_seconds', 'Webhook request latency by action.')
+requestErrors = Counter('csreleasebot_request_errors_total', 'Webhook requests whose handler raised, by action.')
+upstreamCallsPerRequest = Histogram('csreleasebot_upstream_calls_per_request', 'Bamboo and Jira calls made by one webhook request.', COUNT_BUCKETS)
+upstreamCalls = Counter('csreleasebot_upstream_calls_total', 'Bamboo and Jira calls by service.')
+upstreamDuration = Histogram('csreleasebot_upstream_duration_seconds', 'Bamboo and Jira call latency by service.')
+pushUpdates = Counter('csreleasebot_push_updates_total', 'Build and issue updates pushed by Bamboo and Jira webhooks.')
+functionDuration = Histogram('csreleasebot_function_duration_seconds', 'Latency of instrumented functions.')
+
+if contextvars is not None:
+    __requestUpstreamCalls = contextvars.ContextVar('requestUpstreamCalls', default=None)
+else:
+    __requestUpstreamCalls = threading.local()
+
+
+def startRequest():
+    if contextvars is not None:
+        __requestUpstreamCalls.set([0])
+    else:
+        __requestUpstreamCalls.value = [0]
+
+
+def getRequestCounter():
+    if contextvars is not None:
+        return __requestUpstreamCalls.get()
+    return getattr(__requestUpstreamCalls, 'value', None)
+
+
+def getRequestUpstreamCalls():
+    calls = getRequestCounter()
+    if calls is None:
+        return 0
+    return calls[0]
+
+
+def countUpstreamCall(serviceName, duration):
+    upstreamCalls.inc(service=serviceName)
+    upstreamDuration.observe(duration, service=serviceName)
+    calls = getRequestCounter()
+    if calls is not None:
+        calls[0] += 1
+
+
+# observes the duration of the decorated function or coroutine function in functionDuration
+def timed(functionName):
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timedCoroutine(*args, **kwargs):
+                startTime = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    functionDuration.observe(time.perf_counter() - startTime, function=functionName)
+            return timedCoroutine
+
+        @functools.wraps(function)
+        def timedFunction(*args, **kwargs):
+            startTime = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                functionDuration.observe(time.perf_counter() - startTime, function=functionName)
+        return timedFunction
+    return decorate
+
+
+# without contextvars the requests awaited on one event loop share its thread, so their upstream calls can't be told apart
+def isCountedPerRequest(ctx):
+    return contextvars is not None or not ctx.get('isAsync')
+
+
+class MetricsMiddleware(Router.Middleware):
+
+    def before(self, ctx):
+        if isCountedPerRequest(ctx):
+            startRequest()
+        ctx['metricsStartTime'] = time.perf_counter()
+
+    def after(self, ctx, res):
+        requestDuration.observe(time.perf_counter() - ctx['metricsStartTime'], action=ctx['action'])
+        if isCountedPerRequest(ctx):
+            upstreamCallsPerRequest.observe(getRequestUpstreamCalls(), action=ctx['action'])
+        if ctx.get('error') is not None:
+            requestErrors.inc(action=ctx['action'])
+        return res
+
+
+def renderCaches():
+    lines = ['# HELP csreleasebot_cache_requests_total Cache lookups by cache and result.',
+             '# TYPE csreleasebot_cache_requests_total counter']
+    sizeLines = ['# HELP csreleasebot_cache_size Entries held by each cache.',
+                 '# TYPE csreleasebot_cache_size gauge']
+    for cache in sorted(Cache.caches, key=lambda cache: cache.name):
+        stats = cache.stats()
+        for result in ('hits', 'staleHits', 'misses'):
+            lines.append('csreleasebot_cache_requests_total%s %d' % (formatLabels((('cache', cache.name), ('result', result))), stats[result]))
+        sizeLines.append('csreleasebot_cache_size%s %d' % (formatLabels((('cache', cache.name),)), stats['size']))
+    return lines + sizeLines
+
+
+# Prometheus text exposition format
+def render(registry=None):
+    lines = []
+    for metric in __metrics if registry is None else registry:
+        lines.extend(metric.render())
+    if registry is None:
+        lines.extend(renderCaches())
+    return '\n'.join(lines) + '\n'
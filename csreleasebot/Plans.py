@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import datetime as dt
+import logging
+import os
+import threading
+
+from csreleasebot import Common
+from csreleasebot import Schedule
+
+plansFileName = os.environ.get('PLANS_FILE', 'plans.yaml')
+
+__plans = None
+__rejectedContent = None
+__plansLock = threading.Lock()
+
+
+def parseTime(text):
+    return dt.datetime.strptime(str(text), '%H:%M:%S' if str(text).count(':') == 2 else '%H:%M').time()
+
+
+def parseDate(value):
+    if isinstance(value, dt.date):
+        return value
+    return dt.datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+class Plans(object):
+    """plans.yaml compiled into the lookups of BambooAdapter, a new instance replaces the old one on change."""
+
+    def __init__(self, content):
+        self.content = content
+        self.buildNames = {}
+        schedules = {}
+        for buildName, plan in content.get('plans').items():
+            self.buildNames[buildName] = plan['key']
+            schedules[buildName] = Schedule.Schedule([parseTime(time) for time in plan.get('schedule', [])],
+                                                     plan.get('weekdays', Schedule.ALL_WEEKDAYS),
+                                                     [parseDate(date) for date in plan.get('holidays', [])])
+        self.scheduleIndex = Schedule.ScheduleIndex(schedules)
+        self.namedTimes = {name: parseTime(time) for name, time in (content.get('namedTimes') or {}).items()}
+
+
+# compiles the file again when it changes, requests keep using the previous plans meanwhile and if it is invalid
+def getPlans():
+    global __plans, __rejectedContent
+    plans = __plans
+    content = None
+    try:
+        content = Common.loadYamlFile(plansFileName)
+        if plans is not None and (plans.content is content or __rejectedContent is content):
+            return plans
+        if not __plansLock.acquire(blocking=plans is None):
+            return plans
+        try:
+            if __plans is None or __plans.content is not content:
+                __plans = Plans(content)
+                logging.info('Loaded %d plans from %s', len(__plans.buildNames), plansFileName)
+            return __plans
+        finally:
+            __plansLock.release()
+    except Exception:
+        if plans is None:
+            raise
+        __rejectedContent = content
+        logging.exception('Reloading %s failed, keeping the previous plans', plansFileName)
+        return plans
+
+
+def reset():
+    global __plans, __rejectedContent
+    with __plansLock:
+        __plans = None
+        __rejectedContent = None
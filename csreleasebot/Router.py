@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import json
+import logging
+
+try:
+    import contextvars
+except ImportError:  # python 3.6
+    contextvars = None
+
+from csreleasebot import Cache
+
+
+class Middleware(object):
+    """Hooks run around every handler of a router, ctx is shared by the hooks of one request.
+
+    before returns a response to skip the handler, error returns a response to handle the exception.
+    """
+
+    def before(self, ctx):
+        return None
+
+    def after(self, ctx, res):
+        return res
+
+    def error(self, ctx, exc):
+        return None
+
+
+class ErrorMiddleware(Middleware):
+
+    # an empty response lets api.ai answer with the intent's default speech
+    def error(self, ctx, exc):
+        logging.exception('Action %s failed', ctx['action'])
+        return {}
+
+
+class CacheMiddleware(Middleware):
+    """Serves the same response to requests with the same action, parameters and contexts for ttl seconds."""
+
+    def __init__(self, name, ttl):
+        self.ttl = ttl
+        self.cache = Cache.TTLCache(name)
+
+    def before(self, ctx):
+        result = ctx['req'].get('result')
+        ctx['cacheKey'] = json.dumps([ctx['action'], result.get('parameters'), result.get('contexts')], sort_keys=True)
+        isCached, res = self.cache.getIfFresh(ctx['cacheKey'])
+        ctx['cacheHit'] = isCached
+        if isCached:
+            return res
+        return None
+
+    def after(self, ctx, res):
+        if self.ttl > 0 and not ctx['cacheHit'] and not ctx.get('error'):
+            self.cache.put(ctx['cacheKey'], res, self.ttl)
+        return res
+
+
+class Router(object):
+    """Dispatches api.ai requests to the handler registered for their action."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.asyncHandlers = {}
+        self.actionMiddlewares = {}
+        self.middlewares = []
+
+    def action(self, name, middlewares=()):
+        def register(handler):
+            self.handlers[name] = handler
+            self.actionMiddlewares.setdefault(name, list(middlewares))
+            return handler
+        return register
+
+    def asyncAction(self, name, middlewares=()):
+        def register(handler):
+            self.asyncHandlers[name] = handler
+            self.actionMiddlewares.setdefault(name, list(middlewares))
+            return handler
+        return register
+
+    def use(self, middleware):
+        self.middlewares.append(middleware)
+
+    def getContext(self, req):
+        action = req.get("result").get("action")
+        return {'action': action, 'req': req}, self.middlewares + self.actionMiddlewares.get(action, [])
+
+    def dispatch(self, req):
+        ctx, middlewares = self.getContext(req)
+        handler = self.handlers.get(ctx['action'])
+        if handler is None:
+            return {}
+        res, entered = self.__before(ctx, middlewares)
+        if res is None:
+            try:
+                res = handler(req)
+            except Exception as exc:
+                res = self.__error(ctx, entered, exc)
+        return self.__after(ctx, entered, res)
+
+    # actions without an async handler run their sync handler on the default executor
+    async def dispatchAsync(self, req):
+        ctx, middlewares = self.getContext(req)
+        ctx['isAsync'] = True
+        handler = self.asyncHandlers.get(ctx['action'])
+        syncHandler = self.handlers.get(ctx['action'])
+        if handler is None and syncHandler is None:
+            return {}
+        res, entered = self.__before(ctx, middlewares)
+        if res is None:
+            try:
+                if handler is not None:
+                    res = await handler(req)
+                else:
+                    if contextvars is not None:
+                        syncHandler = functools.partial(contextvars.copy_context().run, syncHandler)
+                    res = await asyncio.get_event_loop().run_in_executor(None, syncHandler, req)
+            except Exception as exc:
+                res = self.__error(ctx, entered, exc)
+        return self.__after(ctx, entered, res)
+
+    def __before(self, ctx, middlewares):
+        entered = []
+        for middleware in middlewares:
+            entered.append(middleware)
+            res = middleware.before(ctx)
+            if res is not None:
+                return res, entered
+        return None, entered
+
+    def __error(self, ctx, entered, exc):
+        ctx['error'] = exc
+        for middleware in reversed(entered):
+            res = middleware.error(ctx, exc)
+            if res is not None:
+                return res
+        raise exc
+
+    def __after(self, ctx, entered, res):
+        for middleware in reversed(entered):
+            res = middleware.after(ctx, res)
+        return res
+
+
+router = Router()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import bisect
+import datetime as dt
+import os
+
+import pytz
+
+ALL_WEEKDAYS = range(7)
+
+timezone = pytz.timezone(os.environ.get('SCHEDULE_TIMEZONE', 'Europe/Istanbul'))
+
+
+def now():
+    return dt.datetime.now(timezone)
+
+
+def toSecondsOfDay(time):
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+
+def fromSecondsOfDay(seconds):
+    return dt.time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class Schedule(object):
+    """Run times of a plan kept as sorted seconds of day, it runs on weekdays (0 is Monday) that are not holidays."""
+
+    def __init__(self, times, weekdays=ALL_WEEKDAYS, holidays=()):
+        self.seconds = sorted(set(toSecondsOfDay(time) for time in times))
+        self.times = [fromSecondsOfDay(seconds) for seconds in self.seconds]
+        self.weekdays = frozenset(weekdays)
+        self.holidays = frozenset(holidays)
+
+    def runsOn(self, date):
+        return date.weekday() in self.weekdays and date not in self.holidays
+
+    # returns the time until the first run after currTime and its time of day, None if it never runs
+    def nextRun(self, currTime):
+        return self.nextRunOf(self.seconds, self.times, currTime)
+
+    # same as nextRun for a single time of day on the days of this schedule
+    def nextRunAt(self, time, currTime):
+        return self.nextRunOf([toSecondsOfDay(time)], [time], currTime)
+
+    def nextRunOf(self, seconds, times, currTime):
+        if not seconds or not self.weekdays:
+            return None
+        currSeconds = toSecondsOfDay(currTime)
+        currDate = currTime.date()
+        index = bisect.bisect_right(seconds, currSeconds)
+        # a week of holidays in a row still finds a run, a year of them means the calendar is wrong
+        for days in range(367):
+            if index < len(seconds) and self.runsOn(currDate + dt.timedelta(days=days)):
+                return dt.timedelta(days=days, seconds=seconds[index] - currSeconds), times[index]
+            index = 0
+        return None
+
+
+class ScheduleIndex(object):
+    """Schedules of all plans by plan name, answers for many plans at the same instant."""
+
+    def __init__(self, schedules):
+        self.schedules = dict(schedules)
+
+    def get(self, planName):
+        return self.schedules.get(planName)
+
+    def nextRun(self, planName, currTime=None):
+        schedule = self.schedules.get(planName)
+        if schedule is None:
+            return None
+        return schedule.nextRun(currTime or now())
+
+    def nextRuns(self, planNames, currTime=None):
+        currTime = currTime or now()
+        return {planName: self.nextRun(planName, currTime) for planName in planNames}
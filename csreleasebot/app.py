@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
+import hmac
 import json
+import logging
 import os
 
 from flask import Flask
@@ -9,39 +11,91 @@ from flask import make_response
 
 # Flask app should start in global layout
 from csreleasebot import BambooAdapter
+from csreleasebot import Common
 from csreleasebot import JiraAdapter
+from csreleasebot import Log
+from csreleasebot import Metrics
+from csreleasebot import Plans
+from csreleasebot import Router
+from csreleasebot.Router import router
 
 app = Flask(__name__)
 
+router.use(Router.ErrorMiddleware())
+router.use(Metrics.MetricsMiddleware())
+
+# Bamboo and Jira webhooks are configured with ?token=<PUSH_TOKEN>, pushes are refused while it is not set
+pushToken = os.environ.get('PUSH_TOKEN')
+pushHandlers = {'bamboo': BambooAdapter.applyBuildPush, 'jira': JiraAdapter.applyIssuePush}
+
+
+# loads and compiles the plans and response models once, before gunicorn forks its workers
+def preload():
+    Log.setupLogging()
+    Plans.getPlans()
+    if pushToken is None:
+        logging.warning('PUSH_TOKEN is not set, Bamboo and Jira pushes are refused')
+    for modelName, parameterNames in [('checkReleaseTime', BambooAdapter.releaseTimeParameterNames),
+                                      ('checkReleaseStates', BambooAdapter.releaseStatesParameterNames),
+                                      ('checkIssueDeployment', JiraAdapter.issueDeploymentParameterNames)]:
+        for problem in Common.validateModel('outputs.yaml', modelName, parameterNames):
+            logging.warning('outputs.yaml %s', problem)
+        Common.getCompiledModel('outputs.yaml', modelName)
+
+
+# WSGI app factory: gunicorn --config gunicorn.conf.py 'csreleasebot.app:createApp()'
+def createApp():
+    preload()
+    return app
+
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
     req = request.get_json(silent=True, force=True)
 
-    print("Request:")
-    print(json.dumps(req, indent=4))
+    Log.logPayload('Request', req)
 
     res = processRequest(req)
 
-    res = json.dumps(res, indent=4)
-    # print(res)
+    res = json.dumps(res, separators=(',', ':'))
     r = make_response(res)
     r.headers['Content-Type'] = 'application/json'
     return r
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    r = make_response(Metrics.render())
+    r.headers['Content-Type'] = 'text/plain; version=0.0.4'
+    return r
+
+
+@app.route('/push/<source>', methods=['POST'])
+def push(source):
+    status = processPush(source, request.args.get('token'), request.get_json(silent=True, force=True))
+    return make_response('', status)
+
+
+def isPushAllowed(token):
+    return pushToken is not None and token is not None and hmac.compare_digest(token, pushToken)
+
+
+# returns the HTTP status of a Bamboo build or Jira issue webhook
+def processPush(source, token, payload):
+    handler = pushHandlers.get(source)
+    if handler is None:
+        return 404
+    if not isPushAllowed(token):
+        return 403
+    if not handler(payload):
+        return 400
+    Metrics.pushUpdates.inc(source=source)
+    return 204
+
+
+# handlers are registered with @router.action in the adapters
 def processRequest(req):
-    result = req.get("result")
-    if result.get("action") == "check-release-state":
-        return BambooAdapter.checkReleaseState(req)
-    elif result.get("action") == "check-release-time":
-        return BambooAdapter.checkReleaseTime(req)
-    elif result.get("action") == "check-issue-state":
-        return JiraAdapter.checkIssueState(req)
-    elif result.get("action") == "check-issue-deployment":
-        return JiraAdapter.checkIssueDeploymentState(req)
-    else:
-        return {}
+    return router.dispatch(req)
 
 
 if __name__ == '__main__':
@@ -49,4 +103,6 @@ if __name__ == '__main__':
 
     print("Starting app on port %d" % port)
 
+    preload()
+
     app.run(debug=os.environ['FLASK_DEBUG'], port=port, host='0.0.0.0')
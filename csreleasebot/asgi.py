@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# ASGI entry point, upstream calls are awaited on the event loop instead of holding a thread per request:
+#   uvicorn csreleasebot.asgi:app
+import json
+import logging
+from urllib.parse import parse_qs
+
+from csreleasebot import HttpClient
+from csreleasebot import Log
+from csreleasebot import Metrics
+from csreleasebot.Router import router
+from csreleasebot.app import preload
+from csreleasebot.app import processPush
+
+
+# handlers are registered with @router.asyncAction in the adapters
+async def processRequestAsync(req):
+    return await router.dispatchAsync(req)
+
+
+async def readBody(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def sendResponse(send, status, body, contentType):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', contentType), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def webhook(receive, send):
+    body = await readBody(receive)
+    try:
+        req = json.loads(body.decode('utf-8'))
+    except ValueError:
+        req = None
+
+    Log.logPayload('Request', req)
+
+    res = await processRequestAsync(req)
+
+    res = json.dumps(res, separators=(',', ':'))
+    await sendResponse(send, 200, res.encode('utf-8'), b'application/json')
+
+
+async def push(scope, receive, send):
+    body = await readBody(receive)
+    try:
+        payload = json.loads(body.decode('utf-8'))
+    except ValueError:
+        payload = None
+    token = parse_qs(scope.get('query_string', b'').decode('utf-8')).get('token', [None])[0]
+    status = processPush(scope['path'][len('/push/'):], token, payload)
+    await sendResponse(send, status, b'', b'text/plain')
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            preload()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await HttpClient.closeAsyncClients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] != 'http':
+        logging.warning('Unsupported ASGI scope %s', scope['type'])
+    elif scope['path'] == '/webhook' and scope['method'] == 'POST':
+        await webhook(receive, send)
+    elif scope['path'].startswith('/push/') and scope['method'] == 'POST':
+        await push(scope, receive, send)
+    elif scope['path'] == '/metrics' and scope['method'] == 'GET':
+        await sendResponse(send, 200, Metrics.render().encode('utf-8'), b'text/plain; version=0.0.4')
+    else:
+        await sendResponse(send, 404, b'Not Found', b'text/plain')
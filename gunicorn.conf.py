@@ -0,0 +1,20 @@
+# gunicorn --config gunicorn.conf.py 'csreleasebot.app:createApp()'
+import multiprocessing
+import os
+
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# response models are parsed once in the master, HTTP pools are opened per worker since sockets can't be shared across a fork
+preload_app = True
+
+
+def post_fork(server, worker):
+    from csreleasebot import HttpClient
+    from csreleasebot import Log
+    Log.setupLogging()
+    HttpClient.warmUp()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from csreleasebot import BambooAdapter
+from csreleasebot import HttpClient
+from csreleasebot import JiraAdapter
+from csreleasebot import app
+from csreleasebot import asgi
+from csreleasebot.JiraAdapter import Issue
+from tests.testJiraAdapter import makeIssueJSON
+
+
+class FakeResponse(object):
+
+    def __init__(self, responseJSON):
+        self.text = json.dumps(responseJSON)
+
+
+def callApp(method, path, body, queryString=b''):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': queryString}
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(asgi.app(scope, receive, send))
+    finally:
+        loop.close()
+    return sent[0]['status'], sent[1]['body']
+
+
+class TestAsgi(unittest.TestCase):
+
+    def setUp(self):
+        BambooAdapter.buildCache.clear()
+        JiraAdapter.issueCache.clear()
+
+    def testCheckReleaseState(self):
+        req = {'result': {'action': 'check-release-state', 'parameters': {'release-name': 'prod', 'release-state': 'complete'}, 'contexts': []}}
+        responses = [FakeResponse({'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished'}),
+                     FakeResponse({'buildNumber': 75, 'state': 'Unknown', 'lifeCycleState': 'InProgress'})]
+        with mock.patch.object(HttpClient, 'getAsync', side_effect=responses) as getAsync:
+            status, body = callApp('POST', '/webhook', json.dumps(req).encode('utf-8'))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode('utf-8')).get('speech'), 'prod release is Running')
+        self.assertEqual(getAsync.call_args_list[1][0][1], BambooAdapter.bambooBaseURL + 'result/DEPL-BET1/75')
+
+    def testCheckIssueDeploymentLoadsLinksBeforeResponding(self):
+        req = {'result': {'action': 'check-issue-deployment', 'parameters': {'issueNo': 'CDBT-4289', 'tense': 'future'}, 'contexts': []}}
+        issueJSON = makeIssueJSON('CDBT-4289', linkKeys=['CDBR-898'])
+        searchJSON = {'issues': [makeIssueJSON('CDBR-898', resolutionId=1, resolutionDate='2016-12-26T15:21:55.097+0200')]}
+        with mock.patch.object(Issue, 'getIssueJSONAsync', return_value=issueJSON), \
+                mock.patch.object(Issue, 'searchIssuesJSONAsync', return_value=searchJSON), \
+                mock.patch.object(Issue, 'getIssueJSON') as getIssueJSON, \
+                mock.patch.object(Issue, 'searchIssuesJSON') as searchIssuesJSON:
+            status, body = callApp('POST', '/webhook', json.dumps(req).encode('utf-8'))
+        self.assertFalse(getIssueJSON.called)
+        self.assertFalse(searchIssuesJSON.called)
+        self.assertEqual(json.loads(body.decode('utf-8')).get('speech'), 'CDBT-4289 is already Deployed at 26 December 2016 16:21:55.')
+
+    def testPushIssue(self):
+        payload = {'webhookEvent': 'jira:issue_updated', 'issue': makeIssueJSON('CDBT-4289')}
+        with mock.patch.object(app, 'pushToken', 'test-token'):
+            self.assertEqual(callApp('POST', '/push/jira', json.dumps(payload).encode('utf-8'))[0], 403)
+            status, body = callApp('POST', '/push/jira', json.dumps(payload).encode('utf-8'), b'token=test-token')
+        self.assertEqual(status, 204)
+        self.assertEqual(JiraAdapter.issueCache.peek('CDBT-4289').statusName, 'Closed')
+
+    def testUnknownPath(self):
+        status, body = callApp('GET', '/unknown', b'')
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
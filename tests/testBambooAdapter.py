@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import datetime as dt
 import logging
+import threading
+import time
 import unittest
-
+from unittest import mock
 
 from csreleasebot import BambooAdapter
+from csreleasebot import Schedule
 
 logger = logging.getLogger()
 logger.level = logging.DEBUG
@@ -11,6 +16,9 @@ logger.level = logging.DEBUG
 
 class TestBambooAdapter(unittest.TestCase):
 
+    def setUp(self):
+        BambooAdapter.buildCache.clear()
+
     def testGetBuildResult(self):
         buildResultJSON = BambooAdapter.getBuildResult('ibank', 'latest')
         self.assertNotEqual(buildResultJSON.get('planName'), None)
@@ -31,11 +39,115 @@ class TestBambooAdapter(unittest.TestCase):
         print(str(timeToNextBuildVar))
         print(buildTime)
 
+    def testFindNextBuildTimeAfterLastBuild(self):
+        currTime = Schedule.timezone.localize(dt.datetime(2017, 1, 2, 23, 0, 0))
+        self.assertEqual(BambooAdapter.findNextBuildTime('prod', currTime), (dt.timedelta(hours=13), dt.time(12, 0, 0)))
+        self.assertEqual(BambooAdapter.findNextBuildTimes(['prod', 'ibank'], currTime),
+                         {'prod': (dt.timedelta(hours=13), dt.time(12, 0, 0)), 'ibank': (dt.timedelta(hours=1), dt.time(0, 0, 0))})
+
+    def testTimeToNextBuildAfterAWeekend(self):
+        with mock.patch.object(BambooAdapter, 'findNextBuildTime', return_value=(dt.timedelta(days=2, hours=13), dt.time(12, 0, 0))):
+            self.assertEqual(BambooAdapter.timeToNextBuild({'releaseName': 'prod'}), '61 hours later')
+
     def testFindNextNamedBuildTime(self):
         timeToNextBuildVar, buildTime = BambooAdapter.findNextNamedBuildTime('prod', 'Öğlen')
         print(timeToNextBuildVar)
         self.assertEqual(str(buildTime), '12:00:00')
 
+    def testFindBuildStateFromResultListRunning(self):
+        results = [{'buildNumber': 75, 'state': 'Unknown', 'lifeCycleState': 'InProgress',
+                    'progress': {'prettyTimeRemaining': '5 minutes'}},
+                   {'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished'}]
+        with mock.patch.object(BambooAdapter, 'getBuildResults', return_value=results) as getBuildResults:
+            result, build = BambooAdapter.findBuildStateFromResultList('prod')
+        getBuildResults.assert_called_once_with('prod', 2)
+        self.assertEqual(result, BambooAdapter.BuildState.RUNNING)
+        self.assertEqual(build.buildNumber, 75)
+        self.assertEqual(build.prettyTimeRemaining, '5 minutes')
+
+    def testFindBuildStateFromResultListComplete(self):
+        results = [{'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished'},
+                   {'buildNumber': 73, 'state': 'Failed', 'lifeCycleState': 'Finished'}]
+        with mock.patch.object(BambooAdapter, 'getBuildResults', return_value=results):
+            result, build = BambooAdapter.findBuildStateFromResultList('prod')
+        self.assertEqual(result, BambooAdapter.BuildState.COMPLETE)
+        self.assertEqual(build.buildNumber, 74)
+
+    def testFindBuildStateFromResultListFailed(self):
+        results = [{'buildNumber': 75, 'state': 'Unknown', 'lifeCycleState': 'InProgress'},
+                   {'buildNumber': 74, 'state': 'Failed', 'lifeCycleState': 'Finished'}]
+        with mock.patch.object(BambooAdapter, 'getBuildResults', return_value=results):
+            result, build = BambooAdapter.findBuildStateFromResultList('prod')
+        self.assertEqual(result, BambooAdapter.BuildState.FAILED)
+        self.assertEqual(build.buildNumber, 74)
+
+    def testFindBuildStateModes(self):
+        with mock.patch.object(BambooAdapter, 'buildStateMode', 'list'), \
+                mock.patch.object(BambooAdapter, 'findBuildStateFromResultList', return_value=(None, None)) as fromResultList, \
+                mock.patch.object(BambooAdapter, 'findSingleBuildState') as findSingleBuildState:
+            BambooAdapter.findBuildState('prod')
+        fromResultList.assert_called_once_with('prod')
+        self.assertFalse(findSingleBuildState.called)
+
+    def testFinishedBuildIsCachedForever(self):
+        buildJSON = {'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished'}
+        with mock.patch.object(BambooAdapter, 'getBuildResult', return_value=buildJSON) as getBuildResult:
+            BambooAdapter.findSingleBuildState('prod', 74)
+            build = BambooAdapter.findSingleBuildState('prod', 74)
+        self.assertEqual(getBuildResult.call_count, 1)
+        self.assertEqual(build.buildNumber, 74)
+        self.assertIsNone(BambooAdapter.buildCache.entries[('DEPL-BET1', '74')][1])
+        self.assertEqual(BambooAdapter.buildCache.stats()['hits'], 1)
+
+    def testLatestBuildExpires(self):
+        buildJSON = {'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished'}
+        with mock.patch.object(BambooAdapter, 'getBuildResult', return_value=buildJSON):
+            BambooAdapter.findSingleBuildState('prod', None)
+        self.assertIsNotNone(BambooAdapter.buildCache.entries[('DEPL-BET1', 'latest')][1])
+
+    def testPushedBuildKeepsPollingForTheNextBuild(self):
+        pushJSON = {'build': {'buildResultKey': 'DEPL-BET1-74', 'buildNumber': 74, 'state': 'Successful', 'lifeCycleState': 'Finished'}}
+        self.assertTrue(BambooAdapter.applyBuildPush(pushJSON))
+        entries = BambooAdapter.buildCache.entries
+        self.assertIsNone(entries[('DEPL-BET1', '74')][1])
+        self.assertGreater(entries[('DEPL-BET1', 'latest')][1], time.time() + BambooAdapter.buildCacheTTL)
+        self.assertLessEqual(entries[('DEPL-BET1', '75')][1], time.time() + BambooAdapter.buildCacheTTL)
+        self.assertLessEqual(entries[('DEPL-BET1', 'results')][1], time.time() + BambooAdapter.buildCacheTTL)
+
+    def testFindBuildStatesAnswersSlowPlansAsUnknown(self):
+        release = threading.Event()
+        completeBuild = BambooAdapter.Build()
+        completeBuild.buildRelativeTime = '1 hour ago'
+
+        def findBuildState(buildName):
+            if buildName == 'ibank':
+                release.wait(5)
+            return BambooAdapter.BuildState.COMPLETE, completeBuild
+        with mock.patch.object(BambooAdapter, 'findBuildState', side_effect=findBuildState):
+            states = BambooAdapter.findBuildStates(['beta', 'prod', 'ibank'], budget=0.1)
+        release.set()
+        self.assertEqual(list(states), ['beta', 'prod', 'ibank'])
+        self.assertEqual(states['prod'], (BambooAdapter.BuildState.COMPLETE, completeBuild))
+        self.assertEqual(states['ibank'], (None, None))
+        self.assertEqual(BambooAdapter.makeReleaseStatesResponse(states)['speech'],
+                         'beta release is completed 1 hour ago. prod release is completed 1 hour ago. '
+                         'I don\'t know the state of ibank release right now.')
+
+    def testFindBuildStatesAsyncAnswersFailedPlansAsUnknown(self):
+        async def findBuildStateAsync(buildName):
+            if buildName == 'dev':
+                raise ValueError('Bamboo is down')
+            await asyncio.sleep(0.01)
+            return BambooAdapter.BuildState.RUNNING, BambooAdapter.Build()
+        loop = asyncio.new_event_loop()
+        try:
+            with mock.patch.object(BambooAdapter, 'findBuildStateAsync', side_effect=findBuildStateAsync):
+                states = loop.run_until_complete(BambooAdapter.findBuildStatesAsync(['prod', 'dev'], budget=1))
+        finally:
+            loop.close()
+        self.assertEqual(states['prod'][0], BambooAdapter.BuildState.RUNNING)
+        self.assertEqual(states['dev'], (None, None))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import unittest
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from csreleasebot import Cache
+
+
+class ImmediateExecutor(object):
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = Cache.TTLCache('test', staleTTL=60, clock=self.clock)
+        self.loads = []
+
+    def loader(self, value):
+        def load():
+            self.loads.append(value)
+            return value
+        return load
+
+    def testHitAndMiss(self):
+        self.assertEqual(self.cache.get('key', self.loader('a'), lambda value: 10), 'a')
+        self.assertEqual(self.cache.get('key', self.loader('b'), lambda value: 10), 'a')
+        self.assertEqual(self.loads, ['a'])
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'staleHits': 0, 'misses': 1, 'size': 1})
+
+    def testImmutableEntryNeverExpires(self):
+        self.cache.get('key', self.loader('a'), lambda value: None)
+        self.clock.now += 10 ** 9
+        self.assertEqual(self.cache.get('key', self.loader('b'), lambda value: None), 'a')
+        self.assertEqual(self.loads, ['a'])
+
+    def testStaleWhileRevalidate(self):
+        self.cache.get('key', self.loader('a'), lambda value: 10)
+        self.clock.now += 30
+        with mock.patch.object(Cache, 'getRefreshExecutor', return_value=ImmediateExecutor()):
+            self.assertEqual(self.cache.get('key', self.loader('b'), lambda value: 10), 'a')
+        self.assertEqual(self.cache.refreshing, {})
+        self.assertEqual(self.cache.peek('key'), 'b')
+        self.assertEqual(self.cache.stats()['staleHits'], 1)
+
+    def testExpiredPastStaleWindowLoadsSynchronously(self):
+        self.cache.get('key', self.loader('a'), lambda value: 10)
+        self.clock.now += 100
+        self.assertEqual(self.cache.get('key', self.loader('b'), lambda value: 10), 'b')
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def testMaxSizeEvictsOldest(self):
+        cache = Cache.TTLCache('small', maxSize=2, clock=self.clock)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, key, None)
+        self.assertIsNone(cache.peek('a'))
+        self.assertEqual(cache.peek('c'), 'c')
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = Cache.TTLCache('test')
+        self.loads = []
+        self.release = threading.Event()
+
+    def blockingLoad(self):
+        self.loads.append('a')
+        self.release.wait(5)
+        return 'a'
+
+    def testConcurrentMissesShareOneLoad(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.cache.get, 'key', self.blockingLoad, lambda value: 10) for i in range(4)]
+            while self.cache.flights.coalesced < 3:
+                threading.Event().wait(0.001)
+            self.release.set()
+        self.assertEqual([future.result() for future in futures], ['a'] * 4)
+        self.assertEqual(self.loads, ['a'])
+        self.assertEqual(self.cache.flights.calls, {})
+
+    def testFailureIsSharedAndNotRemembered(self):
+        flights = Cache.SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            self.release.wait(5)
+            raise ValueError('upstream down')
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flights.do, 'key', fail)
+            started.wait(5)
+            follower = executor.submit(flights.do, 'key', lambda: 'b')
+            while flights.coalesced < 1:
+                threading.Event().wait(0.001)
+            self.release.set()
+        self.assertRaises(ValueError, leader.result)
+        self.assertRaises(ValueError, follower.result)
+        self.assertEqual(flights.do('key', lambda: 'b'), 'b')
+
+    def testConcurrentAsyncMissesShareOneLoad(self):
+        async def load():
+            self.loads.append('a')
+            await asyncio.sleep(0.01)
+            return 'a'
+
+        async def getAll():
+            return await asyncio.gather(*[self.cache.getAsync('key', load, lambda value: 10) for i in range(4)])
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(getAll()), ['a'] * 4)
+        finally:
+            loop.close()
+        self.assertEqual(self.loads, ['a'])
+        self.assertEqual(self.cache.flights.asyncCalls, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import datetime as dt
 
@@ -5,6 +7,7 @@ import dateutil.parser
 
 from csreleasebot import BambooAdapter
 from csreleasebot import Common
+from csreleasebot import JiraAdapter
 
 
 class TestCommon(unittest.TestCase):
@@ -19,6 +22,61 @@ class TestCommon(unittest.TestCase):
         message = Common.getMessageFromFile('outputs.yaml', 'checkReleaseTime', parameters)
         self.assertEqual(message, '{releaseName} will be completed in {build.prettyTimeRemaining}.')
 
+    def testYamlFileIsParsedOnceAndReloadedWhenModified(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as yamlFile:
+            yamlFile.write('model: [{msg: first}]')
+        self.addCleanup(os.remove, yamlFile.name)
+        content = Common.loadYamlFile(yamlFile.name)
+        self.assertIs(Common.loadYamlFile(yamlFile.name), content)
+
+        with open(yamlFile.name, 'w') as modifiedFile:
+            modifiedFile.write('model: [{msg: second}]')
+        modifiedTime = os.path.getmtime(yamlFile.name) + 10
+        os.utime(yamlFile.name, (modifiedTime, modifiedTime))
+        self.assertEqual(Common.getMessageFromFile(yamlFile.name, 'model', {}), 'second')
+
+    def testCompiledModelMatchesScoring(self):
+        allModels = Common.loadYamlFile('outputs.yaml')
+        values = {'askedBuildState': ['complete', 'running', 'failed', 'unknown', None],
+                  'tense': ['future', 'past', 'None', None],
+                  'currentBuildState': [state.value for state in BambooAdapter.BuildState],
+                  'isDeployed': [True, False]}
+        for modelName, parameterNames in [('checkReleaseTime', ['askedBuildState', 'tense', 'currentBuildState']),
+                                          ('checkIssueDeployment', ['isDeployed', 'tense'])]:
+            for parameters in self.__combinations(parameterNames, values):
+                model = allModels.get(modelName)
+                while 'msg' not in model[Common.scoreItems(model, parameters)]:
+                    model = model[Common.scoreItems(model, parameters)].get('sub')
+                expected = model[Common.scoreItems(model, parameters)].get('msg')
+                self.assertEqual(Common.getMessageFromFile('outputs.yaml', modelName, parameters), expected, parameters)
+
+    def __combinations(self, parameterNames, values):
+        combinations = [{}]
+        for parameterName in parameterNames:
+            combinations = [dict(combination, **{parameterName: value}) for combination in combinations for value in values[parameterName]]
+        return combinations
+
+    def testOutputsModelIsValid(self):
+        self.assertEqual(Common.validateModel('outputs.yaml', 'checkReleaseTime', BambooAdapter.releaseTimeParameterNames), [])
+        self.assertEqual(Common.validateModel('outputs.yaml', 'checkReleaseStates', BambooAdapter.releaseStatesParameterNames), [])
+        self.assertEqual(Common.validateModel('outputs.yaml', 'checkIssueDeployment', JiraAdapter.issueDeploymentParameterNames), [])
+
+    def testValidateModelFindsMisspelledAndUnreachableItems(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as yamlFile:
+            yamlFile.write('model:\n'
+                           '  - tense: [future, None]\n'
+                           '    msg: a\n'
+                           '  - temse: past\n'
+                           '    msg: b\n'
+                           '  - tense: future\n'
+                           '    msg: c\n')
+        self.addCleanup(os.remove, yamlFile.name)
+        problems = Common.validateModel(yamlFile.name, 'model', ['tense'])
+        self.assertEqual(problems, ["model[1]: unknown key 'temse'",
+                                    'model[2]: unreachable, its values are matched by earlier items',
+                                    "model: items are keyed by different parameters ['temse', 'tense']"])
+        self.assertEqual(Common.getMessageFromFile(yamlFile.name, 'model', {'tense': 'past'}), 'b')
+
     def testParameterExtraction(self):
         matches = Common.extractParametersFromText('{hello} beautiful {world} tell me {some.Joke}')
         self.assertEqual(matches, ['hello', 'world', 'some.Joke'])
@@ -43,6 +101,20 @@ class TestCommon(unittest.TestCase):
         filledString = Common.fillParameters(valuesToFill, '{releaseName} release will start in {timeToNextBuild} hours.')
         self.assertEqual(filledString, 'prod release will start in 3:11:00 hours.')
 
+    def testCompileTemplate(self):
+        segments = Common.compileTemplate('{releaseName} will be completed in {build.prettyTimeRemaining}.')
+        self.assertEqual(segments[0], '')
+        self.assertEqual(segments[1][:2], ('releaseName', 'releaseName'))
+        self.assertIsNone(segments[1][2])
+        self.assertEqual(segments[2], ' will be completed in ')
+        self.assertEqual(segments[3][:2], ('build.prettyTimeRemaining', 'build'))
+        self.assertEqual(segments[4], '.')
+
+    def testParameterFillingKeepsUnknownParameters(self):
+        build = BambooAdapter.Build()
+        filledString = Common.fillParameters({'build': build, 'buildNumber': 74}, '{build.prettyTimeRemaining} {build.missing.attribute} {releaseName} #{buildNumber}')
+        self.assertEqual(filledString, '{build.prettyTimeRemaining} {build.missing.attribute} {releaseName} #74')
+
     def testPrintTimeDelta(self):
         timeDelta = dt.timedelta(hours=12, minutes=35, seconds=23)
         timeDeltaStr = Common.printTimeDelta(timeDelta)
@@ -56,6 +128,9 @@ class TestCommon(unittest.TestCase):
         timeDeltaBeforeStr = Common.printTimeDelta(timeDeltaBefore)
         self.assertEqual(timeDeltaBeforeStr, "35 minutes, 23 seconds later")
 
+        timeDeltaDays = dt.timedelta(days=2, hours=1)
+        self.assertEqual(Common.printTimeDelta(timeDeltaDays), "49 hours later")
+
     def testPrintDatetime(self):
         datetime = dateutil.parser.parse('2017-01-02T12:22:36.686+0200')
         datetimeText = Common.printDateTime(datetime)
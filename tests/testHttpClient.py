@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+
+from csreleasebot import HttpClient
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def tearDown(self):
+        HttpClient.reset()
+
+    def testSessionIsReusedPerService(self):
+        bambooSession = HttpClient.getSession('bamboo')
+        self.assertIs(HttpClient.getSession('bamboo'), bambooSession)
+        self.assertIsNot(HttpClient.getSession('jira'), bambooSession)
+
+    def testSessionIsRecreatedAfterFork(self):
+        session = HttpClient.getSession('bamboo')
+        with mock.patch('os.getpid', return_value=-1):
+            self.assertIsNot(HttpClient.getSession('bamboo'), session)
+
+    def testSessionAdapterConfiguration(self):
+        adapter = HttpClient.getSession('bamboo').get_adapter('http://build.orioncb.com/')
+        self.assertEqual(adapter._pool_maxsize, HttpClient.poolSize)
+        self.assertEqual(adapter.max_retries.total, HttpClient.retries)
+        self.assertEqual(adapter.max_retries.backoff_factor, HttpClient.backoffFactor)
+
+    def testGetPassesTimeouts(self):
+        session = HttpClient.getSession('bamboo')
+        with mock.patch.object(session, 'get') as sessionGet:
+            HttpClient.get('bamboo', 'http://build.orioncb.com/rest/api/latest/result/DEPL-BET1/latest', auth=('user', 'pass'))
+        sessionGet.assert_called_once_with('http://build.orioncb.com/rest/api/latest/result/DEPL-BET1/latest', params=None,
+                                           auth=('user', 'pass'), timeout=(HttpClient.connectTimeout, HttpClient.readTimeout))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
 import unittest
+from unittest import mock
 
 import dateutil.parser
 
@@ -11,8 +13,30 @@ logger = logging.getLogger()
 logger.level = logging.DEBUG
 
 
+def makeIssueJSON(key, statusName='Closed', statusCategoryId=3, resolutionId=None, resolutionDate=None, linkKeys=()):
+    resolution = None
+    if resolutionId is not None:
+        resolution = {'id': str(resolutionId), 'name': 'Done'}
+    issueLinks = []
+    for linkKey in linkKeys:
+        issueLinks.append({'outwardIssue': {'key': linkKey, 'fields': {'status': {'name': 'Closed', 'statusCategory': {'id': 3}}}}})
+    return {
+        'key': key,
+        'id': key.split('-')[1],
+        'fields': {
+            'status': {'name': statusName, 'statusCategory': {'id': statusCategoryId}},
+            'resolution': resolution,
+            'resolutiondate': resolutionDate,
+            'issuelinks': issueLinks,
+        }
+    }
+
+
 class TestJiraAdapter(unittest.TestCase):
 
+    def setUp(self):
+        JiraAdapter.issueCache.clear()
+
     def testGetIssueJSON(self):
         issueNo = 'CDBT-4289'
         issueJSON = Issue.getIssueJSON(issueNo)
@@ -373,6 +397,252 @@ class TestJiraAdapter(unittest.TestCase):
         speech = resultJSON.get('speech')
         self.assertEqual(speech, 'CDBT-4289 is already Deployed at 26 December 2016 15:21:55.')
 
+    def testLinkedIssuesAreLoadedWithOneSearch(self):
+        issueJSON = makeIssueJSON('CDBT-4289', linkKeys=['CDBR-897', 'CDBR-898', 'CDB-1'])
+        searchJSON = {'issues': [makeIssueJSON('CDBR-897', resolutionId=1, resolutionDate='2016-12-20T10:00:00.000+0200'),
+                                 makeIssueJSON('CDBR-898', resolutionId=1, resolutionDate='2016-12-26T15:21:55.097+0200'),
+                                 makeIssueJSON('CDB-1')]}
+        with mock.patch.object(Issue, 'getIssueJSON', return_value=issueJSON) as getIssueJSON, \
+                mock.patch.object(Issue, 'searchIssuesJSON', return_value=searchJSON) as searchIssuesJSON:
+            issue = Issue.fromIssueNo('CDBT-4289')
+            self.assertIsInstance(issue.links[0], JiraAdapter.IssueStub)
+            self.assertTrue(issue.isDeployed)
+            self.assertEqual(issue.deploymentDate, dateutil.parser.parse('2016-12-26T15:21:55.097+0200'))
+            self.assertEqual(issue.links[0].resolutionId, 1)
+            self.assertIs(type(issue.links[2]), Issue)
+        getIssueJSON.assert_called_once_with('CDBT-4289', JiraAdapter.deploymentFields, None)
+        searchIssuesJSON.assert_called_once_with('key in (CDBR-897,CDBR-898,CDB-1)', JiraAdapter.deploymentFields, 0, 3,
+                                                 validateQuery='warn')
+
+    def testIssueLinkedTwiceIsFilledFromOneSearch(self):
+        issueJSON = makeIssueJSON('CDBT-4289', statusName='Open', statusCategoryId=2)
+        releaseLink = {'key': 'CDBR-10', 'fields': {'status': {'name': 'Ready To Deploy', 'statusCategory': {'id': 4}}}}
+        issueJSON['fields']['issuelinks'] = [{'outwardIssue': releaseLink}, {'inwardIssue': releaseLink}]
+        searchJSON = {'issues': [makeIssueJSON('CDBR-10', statusName='Ready To Deploy', statusCategoryId=4)]}
+        issue = Issue.fromLoadedIssueJSON(issueJSON)
+        with mock.patch.object(Issue, 'searchIssuesJSON', return_value=searchJSON) as searchIssuesJSON, \
+                mock.patch.object(Issue, 'getIssueJSON') as getIssueJSON:
+            Issue.loadIssues(issue.links)
+            self.assertEqual([type(link) for link in issue.links], [Issue, Issue])
+            self.assertFalse(issue.getLastReleaseIssue().isDeployed)
+        searchIssuesJSON.assert_called_once_with('key in (CDBR-10)', JiraAdapter.deploymentFields, 0, 1, validateQuery='warn')
+        self.assertFalse(getIssueJSON.called)
+
+    def testLinkedIssuesMissingFromSearchAreLoadedOneByOne(self):
+        issueJSON = makeIssueJSON('CDBT-4289', linkKeys=['CDBR-898'])
+        with mock.patch.object(Issue, 'getIssueJSON', side_effect=[issueJSON, makeIssueJSON('CDBR-898', resolutionId=1)]) as getIssueJSON, \
+                mock.patch.object(Issue, 'searchIssuesJSON', return_value={'errorMessages': ['not found']}):
+            issue = Issue.fromIssueNo('CDBT-4289')
+            self.assertTrue(issue.isDeployed)
+        self.assertEqual(getIssueJSON.call_count, 2)
+
+    def testIssuesDeploymentPagesThroughJQLAndSharesReleases(self):
+        req = {'result': {'action': 'check-issues-deployment', 'parameters': {'jql': 'sprint = 42', 'tense': 'past'}, 'contexts': []}}
+        pages = [{'total': 3, 'issues': [makeIssueJSON('CDBT-1', statusName='Open', statusCategoryId=2, linkKeys=['CDBR-900']),
+                                         makeIssueJSON('CDBT-2', statusName='Open', statusCategoryId=2, linkKeys=['CDBR-899', 'CDBR-900'])]},
+                 {'total': 3, 'issues': [makeIssueJSON('CDBT-3', statusName='Open', statusCategoryId=2)]},
+                 {'issues': [makeIssueJSON('CDBR-900', resolutionId=1, resolutionDate='2016-12-26T16:21:55.097+0300')]}]
+        with mock.patch.object(JiraAdapter, 'searchPageSize', 2), \
+                mock.patch.object(Issue, 'searchIssuesJSON', side_effect=pages) as searchIssuesJSON, \
+                mock.patch.object(Issue, 'getIssueJSON') as getIssueJSON:
+            res = JiraAdapter.checkIssuesDeploymentState(req)
+        self.assertEqual(res['speech'], '2 of 3 issues are Deployed. CDBT-1 is Deployed at 26 December 2016 16:21:55. '
+                                        'CDBT-2 is Deployed at 26 December 2016 16:21:55. CDBT-3 has no release yet.')
+        self.assertEqual([call[0] for call in searchIssuesJSON.call_args_list],
+                         [('sprint = 42', JiraAdapter.deploymentFields, 0, 2), ('sprint = 42', JiraAdapter.deploymentFields, 2, 2),
+                          ('key in (CDBR-900)', JiraAdapter.deploymentFields, 0, 1)])
+        self.assertFalse(getIssueJSON.called)
+
+    def testIssuesDeploymentReportsMissingKeys(self):
+        req = {'result': {'action': 'check-issues-deployment', 'parameters': {'issueNos': 'cdbr-898, CDBR-999 not-a-key CDBR-898'},
+                          'contexts': []}}
+        # with validateQuery=warn Jira leaves unknown keys out and warns about them
+        searchJSON = {'startAt': 0, 'maxResults': 2, 'total': 1,
+                      'issues': [makeIssueJSON('CDBR-898', resolutionId=1, resolutionDate='2016-12-26T16:21:55.097+0300')],
+                      'warningMessages': ["An issue with key 'CDBR-999' does not exist for field 'key'."]}
+        with mock.patch.object(Issue, 'searchIssuesJSON', return_value=searchJSON) as searchIssuesJSON, \
+                mock.patch.object(Issue, 'getIssueJSON') as getIssueJSON:
+            res = JiraAdapter.checkIssuesDeploymentState(req)
+        self.assertEqual(res['speech'], '1 of 1 issues are Deployed. CDBR-898 is already Deployed at 26 December 2016 16:21:55. '
+                                        'CDBR-999, NOT-A-KEY not found.')
+        searchIssuesJSON.assert_called_once_with('key in (CDBR-898,CDBR-999)', JiraAdapter.deploymentFields, 0, 2, validateQuery='warn')
+        self.assertFalse(getIssueJSON.called)
+
+    def testSearchLeavesOutUnknownKeys(self):
+        queryURL, params = Issue.getSearchQuery('key in (CDBR-999)', JiraAdapter.deploymentFields, 0, 1, 'warn')
+        self.assertEqual(params['validateQuery'], 'warn')
+
+    def testUserQueryIsValidatedStrictly(self):
+        errorJSON = {'errorMessages': ["Field 'sprnt' does not exist or you do not have permission to view it."], 'errors': {}}
+        req = {'result': {'action': 'check-issues-deployment', 'parameters': {'jql': 'sprnt = 42'}, 'contexts': []}}
+        with mock.patch.object(Issue, 'searchIssuesJSON', return_value=errorJSON) as searchIssuesJSON:
+            self.assertRaises(RuntimeError, JiraAdapter.checkIssuesDeploymentState, req)
+        searchIssuesJSON.assert_called_once_with('sprnt = 42', JiraAdapter.deploymentFields, 0, JiraAdapter.searchPageSize)
+        queryURL, params = Issue.getSearchQuery('sprnt = 42', JiraAdapter.deploymentFields, 0, 1)
+        self.assertNotIn('validateQuery', params)
+
+    def testIssuesDeploymentFailsOnRejectedSearch(self):
+        errorJSON = {'errorMessages': ['You do not have the permission to see the specified issue.'], 'errors': {}}
+        for parameters in [{'issueNos': 'CDBR-898 CDBR-999'}, {'jql': 'sprint = 42'}]:
+            req = {'result': {'action': 'check-issues-deployment', 'parameters': parameters, 'contexts': []}}
+            with mock.patch.object(Issue, 'searchIssuesJSON', return_value=errorJSON), \
+                    mock.patch.object(Issue, 'getIssueJSON') as getIssueJSON:
+                self.assertRaises(RuntimeError, JiraAdapter.checkIssuesDeploymentState, req)
+            self.assertFalse(getIssueJSON.called)
+
+    def testIssuesDeploymentAsyncSharesReleases(self):
+        req = {'result': {'action': 'check-issues-deployment', 'parameters': {'issueNos': ['CDBT-1', 'CDBT-2']}, 'contexts': []}}
+        pages = [{'issues': [makeIssueJSON('CDBT-1', linkKeys=['CDBR-900']), makeIssueJSON('CDBT-2', linkKeys=['CDBR-900'])]},
+                 {'issues': [makeIssueJSON('CDBR-900', resolutionId=1, resolutionDate='2016-12-26T16:21:55.097+0300')]}]
+        loop = asyncio.new_event_loop()
+        try:
+            with mock.patch.object(Issue, 'searchIssuesJSONAsync', side_effect=pages) as searchIssuesJSONAsync:
+                res = loop.run_until_complete(JiraAdapter.checkIssuesDeploymentStateAsync(req))
+        finally:
+            loop.close()
+        self.assertTrue(res['speech'].startswith('2 of 2 issues are Deployed.'))
+        self.assertEqual(searchIssuesJSONAsync.call_count, 2)
+
+    def testCheckIssueStateRequestsOnlyStatus(self):
+        req = {'result': {'action': 'check-issue-state', 'parameters': {'issueNo': 'CDBT-4289'}, 'contexts': []}}
+        with mock.patch.object(Issue, 'getIssueJSON', return_value={'key': 'CDBT-4289', 'fields': {'status': {'name': 'Closed', 'statusCategory': {'id': 3}}}}) as getIssueJSON:
+            resultJSON = JiraAdapter.checkIssueState(req)
+        getIssueJSON.assert_called_once_with('CDBT-4289', JiraAdapter.stateFields, None)
+        self.assertEqual(resultJSON.get('speech'), 'CDBT-4289 is Closed.')
+
+    def testChangelogIsExpandedOnlyForTransitionDate(self):
+        issueJSON = makeIssueJSON('CDBR-909')
+        changelogJSON = makeIssueJSON('CDBR-909')
+        changelogJSON['changelog'] = {'histories': [
+            {'created': '2016-12-28T19:01:00.959+0200', 'items': [{'field': 'status'}]},
+            {'created': '2016-12-27T10:00:00.000+0200', 'items': [{'field': 'status'}]},
+        ]}
+        with mock.patch.object(Issue, 'getIssueJSON', side_effect=[issueJSON, changelogJSON]) as getIssueJSON:
+            issue = Issue.fromIssueNo('CDBR-909')
+            self.assertEqual(getIssueJSON.call_count, 1)
+            self.assertEqual(issue.lastTransitionDate, dateutil.parser.parse('2016-12-28T19:01:00.959+0200'))
+            self.assertEqual(issue.lastTransitionDate, dateutil.parser.parse('2016-12-28T19:01:00.959+0200'))
+        getIssueJSON.assert_called_with('CDBR-909', JiraAdapter.stateFields, 'changelog')
+        self.assertEqual(getIssueJSON.call_count, 2)
+
+
+    def testClosedReleaseIsServedFromCache(self):
+        with mock.patch.object(Issue, 'getIssueJSON', return_value=makeIssueJSON('CDBR-898', resolutionId=1)) as getIssueJSON:
+            Issue.fromIssueNo('CDBR-898')
+            issue = Issue.fromIssueNo('CDBR-898')
+        self.assertEqual(issue.resolutionId, 1)
+        getIssueJSON.assert_called_once_with('CDBR-898', JiraAdapter.deploymentFields, None)
+
+    def testConcurrentLoadsOfAnIssueShareOneRequest(self):
+        async def getIssueJSONAsync(issueNo, fields=None, expand=None):
+            await asyncio.sleep(0.01)
+            return makeIssueJSON(issueNo, statusName='Open', statusCategoryId=2)
+
+        async def loadAll():
+            return await asyncio.gather(*[Issue.fromIssueNoAsync('CDBT-4289') for i in range(3)])
+        loop = asyncio.new_event_loop()
+        try:
+            with mock.patch.object(Issue, 'getIssueJSONAsync', side_effect=getIssueJSONAsync) as getIssueJSON:
+                issues = loop.run_until_complete(loadAll())
+        finally:
+            loop.close()
+        self.assertEqual([issue.statusName for issue in issues], ['Open'] * 3)
+        self.assertEqual(len(set(map(id, issues))), 3)
+        getIssueJSON.assert_called_once_with('CDBT-4289', JiraAdapter.deploymentFields, None)
+
+    def testStaleIssueIsRevalidatedByUpdated(self):
+        issueJSON = makeIssueJSON('CDBT-4289', statusName='Open', statusCategoryId=2)
+        issueJSON['fields']['updated'] = '2016-12-26T15:21:55.097+0200'
+        updatedJSON = {'key': 'CDBT-4289', 'fields': {'updated': '2016-12-26T15:21:55.097+0200'}}
+        with mock.patch.object(JiraAdapter, 'issueCacheTTL', 0), \
+                mock.patch.object(Issue, 'getIssueJSON', side_effect=[issueJSON, updatedJSON]) as getIssueJSON:
+            Issue.fromIssueNo('CDBT-4289')
+            issue = Issue.fromIssueNo('CDBT-4289')
+        self.assertEqual(issue.statusName, 'Open')
+        getIssueJSON.assert_called_with('CDBT-4289', ['updated'])
+
+    def testChangedIssueIsReloaded(self):
+        issueJSON = makeIssueJSON('CDBT-4289', statusName='Open', statusCategoryId=2)
+        issueJSON['fields']['updated'] = '2016-12-26T15:21:55.097+0200'
+        updatedJSON = {'key': 'CDBT-4289', 'fields': {'updated': '2016-12-27T10:00:00.000+0200'}}
+        with mock.patch.object(JiraAdapter, 'issueCacheTTL', 0), \
+                mock.patch.object(Issue, 'getIssueJSON', side_effect=[issueJSON, updatedJSON, makeIssueJSON('CDBT-4289')]) as getIssueJSON:
+            Issue.fromIssueNo('CDBT-4289')
+            issue = Issue.fromIssueNo('CDBT-4289')
+        self.assertEqual(issue.statusName, 'Closed')
+        self.assertEqual(getIssueJSON.call_count, 3)
+
+    def testPushedReleaseStatusWinsOverLinkStatusOfCachedIssue(self):
+        issueJSON = makeIssueJSON('CDBT-1', statusName='Open', statusCategoryId=2)
+        issueJSON['fields']['updated'] = '2016-12-26T15:21:55.097+0200'
+        issueJSON['fields']['issuelinks'] = [{'outwardIssue': {'key': 'CDBR-10', 'fields': {
+            'status': {'name': 'Ready To Deploy', 'statusCategory': {'id': 4}}}}}]
+        updatedJSON = {'key': 'CDBT-1', 'fields': {'updated': '2016-12-26T15:21:55.097+0200'}}
+        releaseJSON = makeIssueJSON('CDBR-10', resolutionId=1, resolutionDate='2016-12-27T12:00:00.000+0300')
+        req = {'result': {'action': 'check-issue-deployment', 'parameters': {'issueNo': 'CDBT-1', 'tense': 'past'}, 'contexts': []}}
+        with mock.patch.object(JiraAdapter, 'issueCacheTTL', 0), \
+                mock.patch.object(Issue, 'getIssueJSON', side_effect=[issueJSON, updatedJSON]), \
+                mock.patch.object(Issue, 'searchIssuesJSON') as searchIssuesJSON:
+            self.assertFalse(Issue.fromIssueNo('CDBT-1').isDeployed)
+            JiraAdapter.applyIssuePush({'webhookEvent': 'jira:issue_updated', 'issue': releaseJSON})
+            res = JiraAdapter.checkIssueDeploymentState(req)
+        self.assertEqual(res['speech'], 'CDBT-1 is Deployed at 27 December 2016 12:00:00.')
+        self.assertFalse(searchIssuesJSON.called)
+
+    def testStaleLinkedIssuesAreSweptByUpdated(self):
+        issueJSON = makeIssueJSON('CDBT-4289', linkKeys=['CDB-1', 'CDB-2'])
+        searchJSON = {'issues': [makeIssueJSON('CDB-1', statusName='Open', statusCategoryId=2),
+                                 makeIssueJSON('CDB-2', statusName='Open', statusCategoryId=2)]}
+        sweepJSON = {'issues': [makeIssueJSON('CDB-2')]}
+        with mock.patch.object(JiraAdapter, 'issueCacheTTL', 0), \
+                mock.patch.object(Issue, 'getIssueJSON', return_value=issueJSON), \
+                mock.patch.object(Issue, 'searchIssuesJSON', side_effect=[searchJSON, sweepJSON]) as searchIssuesJSON:
+            Issue.loadIssues(Issue.fromIssueNo('CDBT-4289').links)
+            links = Issue.fromIssueNo('CDBT-4289').links
+            Issue.loadIssues(links)
+        self.assertEqual([link.statusName for link in links], ['Open', 'Closed'])
+        searchIssuesJSON.assert_called_with('key in (CDB-1,CDB-2) AND updated >= "-2m"', JiraAdapter.deploymentFields, 0, 2,
+                                            validateQuery='warn')
+
+    def testFailedSweepReloadsStaleIssues(self):
+        issueJSON = makeIssueJSON('CDBT-4289', linkKeys=['CDB-1'])
+        searchJSON = {'issues': [makeIssueJSON('CDB-1', statusName='Open', statusCategoryId=2)]}
+        errorJSON = {'errorMessages': ['You do not have permission to view these issues.'], 'errors': {}}
+        updatedJSON = {'key': 'CDB-1', 'fields': {'updated': '2016-12-27T10:00:00.000+0200'}}
+        with mock.patch.object(JiraAdapter, 'issueCacheTTL', 0), \
+                mock.patch.object(Issue, 'searchIssuesJSON', side_effect=[searchJSON, errorJSON]), \
+                mock.patch.object(Issue, 'getIssueJSON', side_effect=[updatedJSON, makeIssueJSON('CDB-1')]) as getIssueJSON:
+            Issue.loadIssues(Issue.fromLoadedIssueJSON(issueJSON).links)
+            links = Issue.fromLoadedIssueJSON(issueJSON).links
+            Issue.loadIssues(links)
+        self.assertEqual(links[0].statusName, 'Closed')
+        getIssueJSON.assert_called_with('CDB-1', JiraAdapter.deploymentFields, None)
+
+    def testDerivedPropertiesAreMemoized(self):
+        searchJSON = {'issues': [makeIssueJSON('CDBR-898', resolutionId=1, resolutionDate='2016-12-26T15:21:55.097+0200')]}
+        issue = Issue.fromLoadedIssueJSON(makeIssueJSON('CDBT-4289', linkKeys=['CDBR-898']))
+        with mock.patch.object(Issue, 'searchIssuesJSON', return_value=searchJSON):
+            self.assertTrue(issue.isDeployed)
+            deploymentDate = issue.deploymentDate
+        with mock.patch.object(Issue, 'getProjectKey', side_effect=AssertionError('not memoized')):
+            self.assertTrue(issue.isDeployed)
+            self.assertIs(issue.deploymentDate, deploymentDate)
+            self.assertEqual(issue.getLastReleaseIssue().key, 'CDBR-898')
+        self.assertEqual(issue.copy().memo, {})
+
+    def testChangelogDatesAreParsedAtIngest(self):
+        changelogJSON = makeIssueJSON('CDBR-909')
+        changelogJSON['changelog'] = {'histories': [
+            {'created': '2016-12-28T19:01:00.959+0200', 'items': [{'field': 'status'}, {'field': 'resolution'}]},
+        ]}
+        issue = Issue.fromLoadedIssueJSON(changelogJSON)
+        with mock.patch.object(dateutil.parser, 'parse', side_effect=AssertionError('parsed again')):
+            self.assertEqual(issue.lastTransitionDate.isoformat(), '2016-12-28T19:01:00.959000+02:00')
+
+    def testLastReleaseIsOrderedByNumber(self):
+        issue = Issue.fromLoadedIssueJSON(makeIssueJSON('CDBT-4289', linkKeys=['CDBR-999', 'CDB-2000', 'CDBR-1000', 'CDBR-98']))
+        self.assertEqual(issue.getLastReleaseIssue().key, 'CDBR-1000')
+        self.assertEqual(Issue.getIssueNumberFromIssueNo('CDBR-1000'), 1000)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import logging
+import queue
+import sys
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from csreleasebot import Common
+from csreleasebot import Log
+
+
+class TestLog(unittest.TestCase):
+
+    def makeRecord(self, msg, args=None, exc_info=None, payload=None):
+        record = logging.LogRecord('csreleasebot', logging.INFO, __file__, 1, msg, args, exc_info)
+        if payload is not None:
+            record.payload = payload
+        return record
+
+    def testJsonFormatterIsCompact(self):
+        line = Log.JsonFormatter().format(self.makeRecord('Request %s', ('prod',), payload={'result': {'action': 'check-release-state'}}))
+        self.assertNotIn('\n', line)
+        self.assertNotIn(', ', line)
+        entry = json.loads(line)
+        self.assertEqual(entry['message'], 'Request prod')
+        self.assertEqual(entry['payload'], {'result': {'action': 'check-release-state'}})
+
+    def testQueueHandlerKeepsPayloadAndException(self):
+        logQueue = queue.Queue()
+        try:
+            raise ValueError('upstream down')
+        except ValueError:
+            record = self.makeRecord('failed', exc_info=sys.exc_info(), payload={'a': 1})
+        Log.PayloadQueueHandler(logQueue).emit(record)
+        entry = json.loads(Log.JsonFormatter().format(logQueue.get_nowait()))
+        self.assertEqual(entry['payload'], {'a': 1})
+        self.assertIn('ValueError: upstream down', entry['exception'])
+
+    def testPayloadIsSampled(self):
+        with mock.patch.object(Log.logger, 'isEnabledFor', side_effect=lambda level: level == logging.INFO), \
+                mock.patch.object(Log.logger, 'info') as info:
+            with mock.patch('random.random', return_value=Log.payloadSampleRate + 0.001):
+                Log.logPayload('Request', {'a': 1})
+            self.assertFalse(info.called)
+            with mock.patch('random.random', return_value=0.0):
+                Log.logPayload('Request', {'a': 1})
+            info.assert_called_once_with('Request', extra={'payload': {'a': 1}})
+
+    def testResponseIsNotPrinted(self):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            Common.makeCommonResponse('prod release is Complete')
+        self.assertEqual(stdout.getvalue(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
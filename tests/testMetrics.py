@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import mock
+
+from csreleasebot import HttpClient
+from csreleasebot import Metrics
+from csreleasebot import Router
+from csreleasebot import app
+
+
+class TestMetrics(unittest.TestCase):
+
+    def testHistogramRender(self):
+        registry = []
+        histogram = Metrics.Histogram('test_duration_seconds', 'Test latency.', buckets=(0.1, 1.0), registry=registry)
+        histogram.observe(0.05, action='check-release-state')
+        histogram.observe(0.5, action='check-release-state')
+        self.assertEqual(registry, [histogram])
+        self.assertNotIn('test_duration_seconds', Metrics.render())
+        self.assertEqual(histogram.render(), [
+            '# HELP test_duration_seconds Test latency.',
+            '# TYPE test_duration_seconds histogram',
+            'test_duration_seconds_bucket{action="check-release-state",le="0.1"} 1',
+            'test_duration_seconds_bucket{action="check-release-state",le="1.0"} 2',
+            'test_duration_seconds_bucket{action="check-release-state",le="+Inf"} 2',
+            'test_duration_seconds_sum{action="check-release-state"} 0.550000',
+            'test_duration_seconds_count{action="check-release-state"} 2',
+        ])
+
+    def testUpstreamCallsAreCountedPerRequest(self):
+        router = Router.Router()
+        router.use(Metrics.MetricsMiddleware())
+
+        @router.action('check-twice')
+        def checkTwice(req):
+            HttpClient.get('bamboo', 'http://build.orioncb.com/rest/api/latest/result/DEPL-BET1/latest')
+            HttpClient.get('jira', 'http://issues.orioncb.com/rest/api/2/issue/CDBT-1')
+            return {}
+
+        with mock.patch.object(HttpClient, 'getSession'):
+            router.dispatch({'result': {'action': 'check-twice'}})
+        counts, total, count = Metrics.upstreamCallsPerRequest.values[(('action', 'check-twice'),)]
+        self.assertEqual((total, count), (2, 1))
+
+    def testAsyncUpstreamCallsAreNotCountedWithoutContextVars(self):
+        router = Router.Router()
+        router.use(Metrics.MetricsMiddleware())
+
+        @router.asyncAction('check-async')
+        async def checkAsync(req):
+            return {}
+
+        loop = asyncio.new_event_loop()
+        try:
+            with mock.patch.object(Metrics, 'contextvars', None):
+                loop.run_until_complete(router.dispatchAsync({'result': {'action': 'check-async'}}))
+            loop.run_until_complete(router.dispatchAsync({'result': {'action': 'check-async'}}))
+        finally:
+            loop.close()
+        counts, total, count = Metrics.upstreamCallsPerRequest.values[(('action', 'check-async'),)]
+        self.assertEqual(count, 1)
+
+    def testTimedFunction(self):
+        @Metrics.timed('test.timedFunction')
+        def timedFunction(value):
+            return value
+
+        self.assertEqual(timedFunction(3), 3)
+        self.assertEqual(Metrics.functionDuration.values[(('function', 'test.timedFunction'),)][2], 1)
+
+    def testMetricsEndpoint(self):
+        response = app.app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE csreleasebot_request_duration_seconds histogram', text)
+        self.assertIn('csreleasebot_cache_requests_total{cache="build",result="hits"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
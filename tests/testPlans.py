@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import datetime as dt
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from csreleasebot import Plans
+
+PLANS = '''
+plans:
+  prod:
+    key: DEPL-BET1
+    schedule: ['12:00', '22:00']
+    weekdays: [0, 1, 2, 3, 4]
+    holidays: [2017-01-03]
+namedTimes:
+  Öğlen: '12:00'
+'''
+
+
+class TestPlans(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'plans.yaml')
+        self.writePlans(PLANS, 1000)
+        patcher = mock.patch.object(Plans, 'plansFileName', self.fileName)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Plans.reset()
+        self.addCleanup(Plans.reset)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writePlans(self, content, modifiedTime):
+        with open(self.fileName, 'w', encoding='utf-8') as plansFile:
+            plansFile.write(content)
+        os.utime(self.fileName, (modifiedTime, modifiedTime))
+
+    def testCompile(self):
+        plans = Plans.getPlans()
+        self.assertEqual(plans.buildNames, {'prod': 'DEPL-BET1'})
+        self.assertEqual(plans.namedTimes, {'Öğlen': dt.time(12, 0, 0)})
+        schedule = plans.scheduleIndex.get('prod')
+        self.assertEqual(schedule.times, [dt.time(12, 0, 0), dt.time(22, 0, 0)])
+        self.assertEqual(schedule.holidays, frozenset([dt.date(2017, 1, 3)]))
+        self.assertFalse(schedule.runsOn(dt.date(2017, 1, 7)))
+        self.assertIs(Plans.getPlans(), plans)
+
+    def testReloadOnChange(self):
+        plans = Plans.getPlans()
+        self.writePlans(PLANS.replace('DEPL-BET1', 'DEPL-BET2'), 2000)
+        reloaded = Plans.getPlans()
+        self.assertIsNot(reloaded, plans)
+        self.assertEqual(reloaded.buildNames, {'prod': 'DEPL-BET2'})
+        self.assertEqual(plans.buildNames, {'prod': 'DEPL-BET1'})
+
+    def testInvalidChangeKeepsPreviousPlans(self):
+        plans = Plans.getPlans()
+        self.writePlans(PLANS.replace("'22:00'", "'25:00'"), 2000)
+        self.assertIs(Plans.getPlans(), plans)
+        self.writePlans('plans: [', 3000)
+        self.assertIs(Plans.getPlans(), plans)
+
+    def testShippedPlans(self):
+        with mock.patch.object(Plans, 'plansFileName', 'plans.yaml'):
+            plans = Plans.getPlans()
+        self.assertEqual(plans.buildNames.get('prod'), 'DEPL-BET1')
+        self.assertEqual(plans.scheduleIndex.get('alfa').times[0], dt.time(10, 30, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
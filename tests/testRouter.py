@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+
+from csreleasebot import Router
+
+
+def makeRequest(action, parameters=None):
+    return {'result': {'action': action, 'parameters': parameters or {}, 'contexts': []}}
+
+
+class RecordingMiddleware(Router.Middleware):
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def before(self, ctx):
+        self.calls.append(self.name + '.before')
+
+    def after(self, ctx, res):
+        self.calls.append(self.name + '.after')
+        return res
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = Router.Router()
+        self.calls = []
+
+    def testDispatchToRegisteredAction(self):
+        @self.router.action('check-something')
+        def checkSomething(req):
+            return {'speech': req.get('result').get('parameters').get('name')}
+
+        self.assertEqual(self.router.dispatch(makeRequest('check-something', {'name': 'prod'})), {'speech': 'prod'})
+        self.assertEqual(self.router.dispatch(makeRequest('unknown')), {})
+
+    def testMiddlewaresWrapHandlerInOrder(self):
+        self.router.use(RecordingMiddleware('global', self.calls))
+
+        @self.router.action('check-something', middlewares=[RecordingMiddleware('action', self.calls)])
+        def checkSomething(req):
+            self.calls.append('handler')
+            return {}
+
+        self.router.dispatch(makeRequest('check-something'))
+        self.assertEqual(self.calls, ['global.before', 'action.before', 'handler', 'action.after', 'global.after'])
+
+    def testErrorMiddlewareHandlesExceptions(self):
+        self.router.use(Router.ErrorMiddleware())
+        self.router.use(RecordingMiddleware('recording', self.calls))
+
+        @self.router.action('check-something')
+        def checkSomething(req):
+            raise ValueError('upstream down')
+
+        self.assertEqual(self.router.dispatch(makeRequest('check-something')), {})
+        self.assertEqual(self.calls, ['recording.before', 'recording.after'])
+
+    def testUnhandledExceptionIsRaised(self):
+        @self.router.action('check-something')
+        def checkSomething(req):
+            raise ValueError('upstream down')
+
+        with self.assertRaises(ValueError):
+            self.router.dispatch(makeRequest('check-something'))
+
+    def testCacheMiddleware(self):
+        @self.router.action('check-something', middlewares=[Router.CacheMiddleware('test', 60)])
+        def checkSomething(req):
+            self.calls.append('handler')
+            return {'speech': 'answer'}
+
+        for i in range(2):
+            self.assertEqual(self.router.dispatch(makeRequest('check-something', {'name': 'prod'})), {'speech': 'answer'})
+        self.router.dispatch(makeRequest('check-something', {'name': 'beta'}))
+        self.assertEqual(self.calls, ['handler', 'handler'])
+
+    def testDispatchAsync(self):
+        @self.router.asyncAction('check-async')
+        async def checkAsync(req):
+            return {'speech': 'async'}
+
+        @self.router.action('check-sync')
+        def checkSync(req):
+            return {'speech': 'sync'}
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(self.router.dispatchAsync(makeRequest('check-async'))), {'speech': 'async'})
+            self.assertEqual(loop.run_until_complete(self.router.dispatchAsync(makeRequest('check-sync'))), {'speech': 'sync'})
+            self.assertEqual(loop.run_until_complete(self.router.dispatchAsync(makeRequest('unknown'))), {})
+        finally:
+            loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
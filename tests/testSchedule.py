@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import datetime as dt
+import unittest
+
+from csreleasebot import Schedule
+
+
+def makeTime(day, hour, minute=0, second=0):
+    # 2017-01-02 is a Monday
+    return Schedule.timezone.localize(dt.datetime(2017, 1, day, hour, minute, second))
+
+
+class TestSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = Schedule.Schedule([dt.time(22, 0, 0), dt.time(12, 0, 0)])
+
+    def testNextRunSameDay(self):
+        self.assertEqual(self.schedule.nextRun(makeTime(2, 10, 30, 15)), (dt.timedelta(hours=1, minutes=29, seconds=45), dt.time(12, 0, 0)))
+
+    def testNextRunCountsSeconds(self):
+        self.assertEqual(self.schedule.nextRun(makeTime(2, 21, 59, 1)), (dt.timedelta(seconds=59), dt.time(22, 0, 0)))
+
+    def testNextRunAtScheduledTimeIsTheFollowingOne(self):
+        self.assertEqual(self.schedule.nextRun(makeTime(2, 12)), (dt.timedelta(hours=10), dt.time(22, 0, 0)))
+
+    def testNextRunWrapsToNextDay(self):
+        self.assertEqual(self.schedule.nextRun(makeTime(2, 23)), (dt.timedelta(hours=13), dt.time(12, 0, 0)))
+
+    def testNextRunSkipsWeekend(self):
+        schedule = Schedule.Schedule([dt.time(12, 0, 0)], weekdays=range(5))
+        self.assertEqual(schedule.nextRun(makeTime(6, 13)), (dt.timedelta(days=2, hours=23), dt.time(12, 0, 0)))
+
+    def testNextRunSkipsHolidays(self):
+        schedule = Schedule.Schedule([dt.time(12, 0, 0)], holidays=[dt.date(2017, 1, 3)])
+        self.assertEqual(schedule.nextRun(makeTime(2, 13)), (dt.timedelta(days=1, hours=23), dt.time(12, 0, 0)))
+
+    def testNeverRuns(self):
+        self.assertIsNone(Schedule.Schedule([]).nextRun(makeTime(2, 13)))
+        self.assertIsNone(Schedule.Schedule([dt.time(12, 0, 0)], weekdays=[]).nextRun(makeTime(2, 13)))
+
+    def testNextRunAt(self):
+        self.assertEqual(self.schedule.nextRunAt(dt.time(12, 0, 0), makeTime(2, 13)), (dt.timedelta(hours=23), dt.time(12, 0, 0)))
+
+    def testNextRuns(self):
+        index = Schedule.ScheduleIndex({'beta': self.schedule, 'ibank': Schedule.Schedule([dt.time(0, 0, 0)])})
+        self.assertEqual(index.nextRuns(['beta', 'ibank', 'unknown'], makeTime(2, 23)),
+                         {'beta': (dt.timedelta(hours=13), dt.time(12, 0, 0)),
+                          'ibank': (dt.timedelta(hours=1), dt.time(0, 0, 0)),
+                          'unknown': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+import requests
+
+from benchmarks import StandIn
+
+FIXTURES = {
+    'bamboo': {'result/DEPL-BET1/latest': {'buildNumber': 231, 'state': 'Successful'}},
+    'jira': {
+        'issue/CDBR-898': {'key': 'CDBR-898', 'fields': {'status': {'name': 'Closed'}}},
+        'issue/CDB-1?fields=status': {'key': 'CDB-1', 'fields': {'status': {'name': 'Open'}}},
+    },
+}
+
+
+class TestStandIn(unittest.TestCase):
+
+    def setUp(self):
+        self.standIn = StandIn.StandIn(FIXTURES).start()
+        self.addCleanup(self.standIn.stop)
+        self.baseURLs = self.standIn.getBaseURLs()
+
+    def get(self, baseURLName, path, params=None):
+        response = requests.get(self.baseURLs[baseURLName] + path, params=params)
+        return response.status_code, json.loads(response.text)
+
+    def testReplay(self):
+        self.assertEqual(self.get('BAMBOO_BASE_URL', 'result/DEPL-BET1/latest'), (200, {'buildNumber': 231, 'state': 'Successful'}))
+        self.assertEqual(self.get('JIRA_BASE_URL', 'issue/CDBR-898', {'fields': 'status,updated'})[1]['key'], 'CDBR-898')
+        self.assertEqual(self.get('JIRA_BASE_URL', 'issue/CDB-1', {'fields': 'status'})[1]['key'], 'CDB-1')
+        self.assertEqual(self.get('BAMBOO_BASE_URL', 'result/DEPL-BET1/232')[0], 404)
+        self.assertEqual(self.standIn.getCallCount('bamboo'), 2)
+        self.assertEqual(self.standIn.getCallCount(), 4)
+
+    def testSearchByKeys(self):
+        status, searchJSON = self.get('JIRA_BASE_URL', 'search', {'jql': 'key in (CDBR-898,CDBR-899)', 'fields': 'status'})
+        self.assertEqual([issueJSON['key'] for issueJSON in searchJSON['issues']], ['CDBR-898'])
+        status, searchJSON = self.get('JIRA_BASE_URL', 'search', {'jql': 'key in (CDBR-898) AND updated >= "-2m"'})
+        self.assertEqual(searchJSON['issues'], [])
+
+    def testInjectedErrors(self):
+        self.standIn.errorRate = 1.0
+        self.assertEqual(self.get('BAMBOO_BASE_URL', 'result/DEPL-BET1/latest')[0], 503)
+        self.standIn.errorRate = 0.0
+        self.assertEqual(self.get('BAMBOO_BASE_URL', 'result/DEPL-BET1/latest')[0], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
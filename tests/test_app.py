@@ -1,5 +1,13 @@
+import json
 import logging
 import unittest
+from unittest import mock
+
+from csreleasebot import BambooAdapter
+from csreleasebot import Common
+from csreleasebot import JiraAdapter
+from csreleasebot import app
+from csreleasebot.JiraAdapter import Issue
 
 logger = logging.getLogger()
 logger.level = logging.DEBUG
@@ -22,5 +30,95 @@ class TestStringMethods(unittest.TestCase):
             s.split(2)
 
 
+pushToken = 'test-token'
+
+
+class PushSender(object):
+    """Stands in for the Bamboo and Jira webhooks, posting their payloads to the push endpoints."""
+
+    def __init__(self, client, token=pushToken):
+        self.client = client
+        self.token = token
+
+    def post(self, source, payload):
+        path = '/push/%s' % source
+        if self.token is not None:
+            path += '?token=%s' % self.token
+        return self.client.post(path, data=json.dumps(payload)).status_code
+
+    def sendBuild(self, planKey, buildNumber, state='Successful', lifeCycleState='Finished'):
+        return self.post('bamboo', {'build': {'buildResultKey': '%s-%d' % (planKey, buildNumber), 'buildNumber': buildNumber,
+                                              'state': state, 'lifeCycleState': lifeCycleState}})
+
+    def sendIssue(self, key, fields, event='jira:issue_updated'):
+        return self.post('jira', {'webhookEvent': event, 'issue': {'key': key, 'id': key.split('-')[1], 'fields': fields}})
+
+
+class TestApp(unittest.TestCase):
+
+    def setUp(self):
+        BambooAdapter.buildCache.clear()
+        JiraAdapter.issueCache.clear()
+        JiraAdapter.issueDeploymentResponseCache.cache.clear()
+        pushTokenPatch = mock.patch.object(app, 'pushToken', pushToken)
+        pushTokenPatch.start()
+        self.addCleanup(pushTokenPatch.stop)
+
+    def testCreateAppPreloadsModels(self):
+        with mock.patch.object(Common, 'getCompiledModel') as getCompiledModel:
+            flaskApp = app.createApp()
+        self.assertIs(flaskApp, app.app)
+        self.assertEqual([call[0] for call in getCompiledModel.call_args_list],
+                         [('outputs.yaml', 'checkReleaseTime'), ('outputs.yaml', 'checkReleaseStates'),
+                          ('outputs.yaml', 'checkIssueDeployment')])
+
+    def testWebhookUnknownAction(self):
+        client = app.createApp().test_client()
+        response = client.post('/webhook', data=json.dumps({'result': {'action': 'unknown'}}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data(as_text=True)), {})
+
+    def testPushedBuildAnswersReleaseState(self):
+        sender = PushSender(app.createApp().test_client())
+        self.assertEqual(sender.sendBuild('DEPL-BET1', 42), 204)
+        req = {'result': {'action': 'check-release-state', 'parameters': {'release-name': 'prod', 'release-state': 'complete'}, 'contexts': []}}
+        with mock.patch.object(BambooAdapter, 'getBuildResult') as getBuildResult, \
+                mock.patch.object(BambooAdapter, 'getBuildResults') as getBuildResults:
+            self.assertEqual(app.processRequest(req).get('speech'), 'prod release is Complete')
+        getBuildResult.assert_not_called()
+        getBuildResults.assert_not_called()
+
+    def testPushedIssuesAnswerIssueDeployment(self):
+        sender = PushSender(app.createApp().test_client())
+        self.assertEqual(sender.sendIssue('CDBR-898', {'status': {'name': 'Closed', 'statusCategory': {'id': 3}},
+                                                       'resolution': {'id': '1', 'name': 'Done'},
+                                                       'resolutiondate': '2016-12-26T15:21:55.097+0200', 'issuelinks': []}), 204)
+        self.assertEqual(sender.sendIssue('CDBT-4289', {'status': {'name': 'Closed', 'statusCategory': {'id': 3}}, 'issuelinks': [
+            {'outwardIssue': {'key': 'CDBR-898', 'fields': {'status': {'name': 'Closed', 'statusCategory': {'id': 3}}}}}]}), 204)
+        req = {'result': {'action': 'check-issue-deployment', 'parameters': {'issueNo': 'CDBT-4289', 'tense': 'past'}, 'contexts': []}}
+        with mock.patch.object(Issue, 'getIssueJSON') as getIssueJSON, \
+                mock.patch.object(Issue, 'searchIssuesJSON') as searchIssuesJSON:
+            speech = app.processRequest(req).get('speech')
+        self.assertEqual(speech, 'CDBT-4289 is Deployed at 26 December 2016 16:21:55.')
+        getIssueJSON.assert_not_called()
+        searchIssuesJSON.assert_not_called()
+
+    def testDeletedIssueIsDropped(self):
+        sender = PushSender(app.createApp().test_client())
+        sender.sendIssue('CDBT-4289', {'status': {'name': 'Open', 'statusCategory': {'id': 2}}})
+        self.assertEqual(sender.sendIssue('CDBT-4289', {}, event='jira:issue_deleted'), 204)
+        self.assertIsNone(JiraAdapter.issueCache.peek('CDBT-4289'))
+
+    def testPushRejectsBadRequests(self):
+        client = app.createApp().test_client()
+        self.assertEqual(client.post('/push/unknown', data='{}').status_code, 404)
+        self.assertEqual(PushSender(client).post('bamboo', {'build': {}}), 400)
+        self.assertEqual(PushSender(client, None).sendBuild('DEPL-BET1', 42), 403)
+        self.assertEqual(PushSender(client, 'wrong').sendBuild('DEPL-BET1', 42), 403)
+        self.assertEqual(PushSender(client).sendBuild('DEPL-BET1', 42), 204)
+        with mock.patch.object(app, 'pushToken', None):
+            self.assertEqual(PushSender(client, None).sendBuild('DEPL-BET1', 42), 403)
+
+
 if __name__ == '__main__':
     unittest.main()